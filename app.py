@@ -7,17 +7,30 @@ import os
 from dotenv import load_dotenv
 # Force load .env to override any stale/invalid system environment variables
 load_dotenv(override=True)
+# HF tokenizers' thread pool warns (and disables itself) on every fork otherwise
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
 
 import json
 import time
+import atexit
+import collections
+import functools
 import hashlib
+import hmac
 import html
-import markdown
+import importlib
+import logging
+import sqlite3
+import threading
 from datetime import datetime
 import streamlit as st
 
-# import your backend answer function (must exist in project)
-from rag.answer import answer_query
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson  # optional C-accelerated JSON
+except ImportError:
+    orjson = None
 
 # -------------------------
 # Page config
@@ -29,18 +42,52 @@ st.set_page_config(page_title="AI Legal RAG — Polished UI", page_icon="⚖️"
 # -------------------------
 DATA_DIR = "data"
 USERS_FP = os.path.join(DATA_DIR, "users.json")
+DB_FP = os.path.join(DATA_DIR, "legal_ai.db")
 CONVO_DIR = os.path.join(DATA_DIR, "conversations")
 DOCS_DIR = os.path.join(DATA_DIR, "docs")
+CHAT_WINDOW = 40  # messages rendered per "page" of chat history
 os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(CONVO_DIR, exist_ok=True)
 os.makedirs(DOCS_DIR, exist_ok=True)
 
 # -------------------------
 # Utilities
 # -------------------------
-def sha256(s: str) -> str:
+# app.py is re-executed on every interaction, so plain module globals (locks,
+# functools caches) start fresh each rerun. These helpers park them in
+# st.cache_resource so they are shared by the whole process.
+@st.cache_resource(show_spinner=False)
+def shared_lock(name: str) -> threading.RLock:
+    return threading.RLock()
+
+def persistent_lru(maxsize: int):
+    """functools.lru_cache whose cache survives script reruns."""
+    def deco(fn):
+        @st.cache_resource(show_spinner=False)
+        def _wrapped(qualname: str, size: int):
+            return functools.lru_cache(maxsize=size)(fn)
+        return _wrapped(fn.__qualname__, maxsize)
+    return deco
+
+def legacy_sha256(s: str) -> str:
+    # only for verifying pre-scrypt password hashes; not a general-purpose hash
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+# scrypt parameters for password hashes ("scrypt$<salt>$<key>"); plain sha256
+# hashes from older accounts are still accepted and upgraded on next sign-in.
+_SCRYPT_N, _SCRYPT_R, _SCRYPT_P = 2**14, 8, 1
+
+def hash_password(pw: str) -> str:
+    salt = os.urandom(16)
+    key = hashlib.scrypt(pw.encode("utf-8"), salt=salt, n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P)
+    return f"scrypt${salt.hex()}${key.hex()}"
+
+def verify_password(pw: str, stored: str) -> bool:
+    if stored.startswith("scrypt$"):
+        _, salt_hex, key_hex = stored.split("$", 2)
+        key = hashlib.scrypt(pw.encode("utf-8"), salt=bytes.fromhex(salt_hex), n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P)
+        return hmac.compare_digest(key.hex(), key_hex)
+    return hmac.compare_digest(stored, legacy_sha256(pw))
+
 def read_json(fp, default):
     try:
         with open(fp, "r", encoding="utf-8") as f:
@@ -48,10 +95,16 @@ def read_json(fp, default):
     except Exception:
         return default
 
-def write_json(fp, data):
-    with open(fp, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def dumps_compact(data) -> str:
+    """Compact JSON for machine-read columns; orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
 
+def loads_compact(s: str):
+    return orjson.loads(s) if orjson is not None else json.loads(s)
+
+@persistent_lru(maxsize=1024)
 def safe_truncate(text: str, n: int = 42) -> str:
     t = " ".join((text or "").split())
     return (t[:n] + "…") if len(t) > n else t
@@ -61,115 +114,277 @@ def now_ts():
 
 def fmt_time(ts):
     try:
-        return datetime.fromtimestamp(ts).strftime("%b %d %H:%M")
+        # whole seconds are enough for "%b %d %H:%M" and make the cache hit
+        return _fmt_time(int(ts))
     except Exception:
         return ""
 
-def esc(s: str) -> str:
-    return html.escape(s)
+@persistent_lru(maxsize=8192)
+def _fmt_time(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%b %d %H:%M")
+
+# -------------------------
+# Storage (SQLite)
+# -------------------------
+# users/conversations/messages live in one SQLite file so a message append is a
+# single INSERT instead of rewriting the whole conversation JSON each turn.
+_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    title TEXT,
+    updatedAt INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_email ON conversations(email, updatedAt DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cid TEXT NOT NULL,
+    ts REAL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    suggestions JSON
+);
+CREATE INDEX IF NOT EXISTS idx_messages_cid ON messages(cid);
+"""
+
+DB_SCHEMA_VERSION = 1  # PRAGMA user_version once the legacy JSON store has been imported
+
+def _db_import_json(conn):
+    """
+    Import of the legacy users.json / conversations/*.json store. Idempotent:
+    users and conversations already present are skipped (and so are their
+    messages), and malformed records are logged and skipped.
+    """
+    for u in read_json(USERS_FP, []):
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO users(email, name, password_hash) VALUES (?, ?, ?)",
+                (u["email"].strip().lower(), u.get("name", ""), u["password_hash"]),
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            logger.warning("Skipping malformed legacy user record: %r", e)
+    if not os.path.isdir(CONVO_DIR):
+        return
+    # legacy file names are email.replace('@', '_at_'); map them back through the
+    # known users rather than reversing the replace, which breaks on "_at_" in addresses
+    owners = {e.replace("@", "_at_"): e for (e,) in conn.execute("SELECT email FROM users")}
+    for fname in os.listdir(CONVO_DIR):
+        if not fname.endswith(".json"):
+            continue
+        stem = fname[:-len(".json")]
+        for c in read_json(os.path.join(CONVO_DIR, fname), []):
+            try:
+                email = (c.get("email") or owners.get(stem) or stem.replace("_at_", "@", 1)).strip().lower()
+                rows = [
+                    (c["id"], m.get("ts"), m["role"], m.get("content", ""),
+                     dumps_compact(m["suggestions"]) if m.get("suggestions") else None)
+                    for m in c.get("messages", [])
+                ]
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO conversations(id, email, title, updatedAt) VALUES (?, ?, ?, ?)",
+                    (c["id"], email, c.get("title"), c.get("updatedAt") or now_ts()),
+                )
+            except (KeyError, TypeError, AttributeError) as e:
+                logger.warning("Skipping malformed legacy conversation in %s: %r", fname, e)
+                continue
+            if cur.rowcount:
+                conn.executemany(
+                    "INSERT INTO messages(cid, ts, role, content, suggestions) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+def seed_demo_user(conn):
+    # Only for an empty install (as before): never add a known password next to migrated users
+    if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+        return
+    conn.execute(
+        "INSERT OR IGNORE INTO users(email, name, password_hash) VALUES (?, ?, ?)",
+        ("demo@legal.ai", "Demo User", hash_password("demo1234")),
+    )
+
+@st.cache_resource(show_spinner=False)
+def _db() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_FP, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL skips the fsync on every commit; appends accumulate in
+    # the WAL and reach the main file at checkpoints (db_flush / exit).
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_DB_SCHEMA)
+    # The migration is recorded in the same transaction as the import, so a
+    # failed import leaves user_version at 0 and is retried on the next start
+    if conn.execute("PRAGMA user_version").fetchone()[0] < DB_SCHEMA_VERSION:
+        with conn:
+            _db_import_json(conn)
+            seed_demo_user(conn)
+            conn.execute(f"PRAGMA user_version = {DB_SCHEMA_VERSION}")
+    atexit.register(conn.close)
+    return conn
+
+def db_query(sql: str, params=()):
+    with shared_lock("db"):
+        return _db().execute(sql, params).fetchall()
+
+def db_write(*statements):
+    """Run (sql, params) pairs in a single transaction."""
+    with shared_lock("db"):
+        conn = _db()
+        with conn:
+            for sql, params in statements:
+                conn.execute(sql, params)
+
+def db_flush():
+    """Checkpoint buffered WAL writes into the main database file."""
+    with shared_lock("db"):
+        _db().execute("PRAGMA wal_checkpoint(PASSIVE)")
 
 # -------------------------
 # Users & Conversations
 # -------------------------
-def users_all(): return read_json(USERS_FP, [])
-def users_save(u): write_json(USERS_FP, u)
+def users_all():
+    return [dict(r) for r in db_query("SELECT email, name, password_hash FROM users")]
 
 def find_user(email: str):
     email = (email or "").strip().lower()
-    for u in users_all():
-        if u["email"].lower() == email:
-            return u
-    return None
+    rows = db_query("SELECT email, name, password_hash FROM users WHERE email = ?", (email,))
+    return dict(rows[0]) if rows else None
 
 def upsert_user(user):
-    users = users_all()
-    for i, u in enumerate(users):
-        if u["email"].lower() == user["email"].lower():
-            users[i] = user; users_save(users); return
-    users.append(user); users_save(users)
-
-def seed_demo_user():
-    if not os.path.exists(USERS_FP):
-        users_save([{"email":"demo@legal.ai","name":"Demo User","password_hash":sha256("demo1234")}])
-seed_demo_user()
-
-def convo_path(email: str) -> str:
-    return os.path.join(CONVO_DIR, f"{email.lower().replace('@','_at_')}.json")
+    db_write((
+        "INSERT INTO users(email, name, password_hash) VALUES (?, ?, ?) "
+        "ON CONFLICT(email) DO UPDATE SET name = excluded.name, password_hash = excluded.password_hash",
+        (user["email"].strip().lower(), user["name"], user["password_hash"]),
+    ))
 
 def convos_load(email: str):
-    return read_json(convo_path(email), [])
-
-def convos_save(email: str, convos):
-    write_json(convo_path(email), convos)
-
-def convos_ensure(email: str):
-    if not os.path.exists(convo_path(email)):
-        convos_save(email, [])
-    return convos_load(email)
+    """Conversation headers (id, title, updatedAt), most recently updated first."""
+    rows = db_query(
+        "SELECT id, title, updatedAt FROM conversations WHERE email = ? ORDER BY updatedAt DESC, rowid DESC",
+        (email.lower(),),
+    )
+    return [dict(r) for r in rows]
+
+def convo_messages(cid: str):
+    rows = db_query("SELECT role, content, ts, suggestions FROM messages WHERE cid = ? ORDER BY id", (cid,))
+    msgs = []
+    for r in rows:
+        msg = {"role": r["role"], "content": r["content"], "ts": r["ts"]}
+        if r["suggestions"]:
+            msg["suggestions"] = loads_compact(r["suggestions"])
+        msgs.append(msg)
+    return msgs
+
+def convo_get_header(email: str, cid: str):
+    rows = db_query(
+        "SELECT id, title, updatedAt FROM conversations WHERE id = ? AND email = ?",
+        (cid, email.lower()),
+    )
+    return dict(rows[0]) if rows else None
+
+def convo_message_count(cid: str) -> int:
+    return db_query("SELECT COUNT(*) FROM messages WHERE cid = ?", (cid,))[0][0]
+
+def convo_get(email: str, cid: str):
+    """Full conversation (header + messages) or None if it doesn't belong to `email`."""
+    convo = convo_get_header(email, cid)
+    if convo is None:
+        return None
+    convo["messages"] = convo_messages(cid)
+    return convo
+
+def db_version() -> int:
+    # every write goes through the one shared connection, so its change counter
+    # works as a version stamp for anything read from the database
+    return _db().total_changes
+
+def convos_cached(email: str):
+    """convos_load memoised in session_state until the next database write."""
+    key = ("convos", email, db_version())
+    hit = st.session_state.get("_convos_cache")
+    if hit and hit[0] == key:
+        return hit[1]
+    convs = convos_load(email)
+    st.session_state["_convos_cache"] = (key, convs)
+    return convs
+
+def convo_cached(email: str, cid: str):
+    """convo_get memoised in session_state until the next database write."""
+    key = ("convo", email, cid, db_version())
+    hit = st.session_state.get("_active_convo_cache")
+    if hit and hit[0] == key:
+        return hit[1]
+    convo = convo_get(email, cid)
+    st.session_state["_active_convo_cache"] = (key, convo)
+    return convo
 
 def convo_create(email: str, title: str = "New chat"):
-    convos = convos_ensure(email)
-    cid = f"c_{int(time.time()*1000)}"
-    convo = {
-        "id": cid,
-        "title": title,
-        "updatedAt": now_ts(),
-        "messages": [
-            {"role":"assistant","content":"Hi! Ask me anything about the law ⚖️","ts": time.time()}
-        ],
-    }
-    convos.insert(0, convo)
-    convos_save(email, convos)
+    t = time.time()
+    cid = f"c_{int(t*1000)}"
+    db_write(
+        ("INSERT INTO conversations(id, email, title, updatedAt) VALUES (?, ?, ?, ?)",
+         (cid, email.lower(), title, int(t))),
+        ("INSERT INTO messages(cid, ts, role, content) VALUES (?, ?, ?, ?)",
+         (cid, t, "assistant", "Hi! Ask me anything about the law ⚖️")),
+    )
     return cid
 
+# Ownership is checked inside each statement rather than with a separate lookup.
+_OWNED_CID = "SELECT id FROM conversations WHERE id = ? AND email = ?"
+
 def convo_delete(email: str, cid: str):
-    convs = convos_ensure(email)
-    convs = [c for c in convs if c["id"] != cid]
-    convos_save(email, convs)
+    db_write(
+        (f"DELETE FROM messages WHERE cid IN ({_OWNED_CID})", (cid, email.lower())),
+        ("DELETE FROM conversations WHERE id = ? AND email = ?", (cid, email.lower())),
+    )
 
 def convo_append_msg(email: str, cid: str, role: str, content: str, suggestions: list = None):
     """
     Append a message to conversation `cid` for `email`.
-    Ensures the conversation file exists, updates the convo, and saves it.
+    Inserts the message row and bumps the conversation's updatedAt in one transaction.
     """
-    convs = convos_ensure(email)           # ensure 'convs' is defined
-    for c in convs:
-        if c["id"] == cid:
-            msg = {"role": role, "content": content, "ts": time.time()}
-            if suggestions:
-                msg["suggestions"] = suggestions
-            c["messages"].append(msg)
-            c["updatedAt"] = now_ts()
-            # if the convo title is still default/new, set it from user's first message
-            if role == "user" and (c.get("title") in [None, "", "New chat"]) and len(c["messages"]) <= 3:
-                c["title"] = safe_truncate(content, 52)
-            break
-    convos_save(email, convs)              # save the updated convos back to disk
+    c = convo_get_header(email, cid)
+    if not c:
+        return
+    t = time.time()
+    stmts = [
+        ("INSERT INTO messages(cid, ts, role, content, suggestions) VALUES (?, ?, ?, ?, ?)",
+         (cid, t, role, content, dumps_compact(suggestions) if suggestions else None)),
+        ("UPDATE conversations SET updatedAt = ? WHERE id = ?", (int(t), cid)),
+    ]
+    # if the convo title is still default/new, set it from user's first message
+    if role == "user" and (c.get("title") in [None, "", "New chat"]):
+        if convo_message_count(cid) + 1 <= 3:
+            stmts.append(("UPDATE conversations SET title = ? WHERE id = ?", (safe_truncate(content, 52), cid)))
+    db_write(*stmts)
 
 def convo_clear(email: str, cid: str):
-    convs = convos_ensure(email)
-    for c in convs:
-        if c["id"] == cid:
-            c["messages"] = []
-            c["updatedAt"] = now_ts()
-            break
-    convos_save(email, convs)
+    db_write(
+        (f"DELETE FROM messages WHERE cid IN ({_OWNED_CID})", (cid, email.lower())),
+        ("UPDATE conversations SET updatedAt = ? WHERE id = ? AND email = ?", (now_ts(), cid, email.lower())),
+    )
 
 # -------------------------
 # Auth helpers
 # -------------------------
 def login(email: str, password: str) -> bool:
     u = find_user(email)
-    if not u or u["password_hash"] != sha256(password):
+    if not u or not verify_password(password, u["password_hash"]):
         return False
+    if not u["password_hash"].startswith("scrypt$"):
+        u["password_hash"] = hash_password(password); upsert_user(u)
     st.session_state["user"] = {"email": u["email"], "name": u["name"]}
-    convos_ensure(u["email"])
     if not st.session_state.get("active_cid"):
         convs = convos_load(u["email"])
         st.session_state["active_cid"] = convs[0]["id"] if convs else convo_create(u["email"])
     return True
 
 def logout():
+    db_flush()
     st.session_state.pop("user", None)
     st.session_state.pop("active_cid", None)
     st.session_state.pop("route", None)
@@ -219,8 +434,17 @@ THEME_CONFIG = {
     },
 }
 
+_THEME_ORDER = list(THEME_CONFIG.keys())
+_THEME_INDEX = {name: i for i, name in enumerate(_THEME_ORDER)}
+
+CHAT_MODES = ["Normal", "Summary", "Quiz", "ELI5", "Drafting"]
+_MODE_INDEX = {name: i for i, name in enumerate(CHAT_MODES)}
+
 def theme_css():
-    theme_name = st.session_state.get("theme", "Midnight Purple")
+    return _theme_css_for(st.session_state.get("theme", "Midnight Purple"))
+
+@st.cache_data(max_entries=len(THEME_CONFIG), show_spinner=False)
+def _theme_css_for(theme_name: str) -> str:
     cfg = THEME_CONFIG.get(theme_name, THEME_CONFIG["Midnight Purple"])
     
     return f"""
@@ -394,6 +618,10 @@ inject_theme()
 # -------------------------
 # Diagnostics helper
 # -------------------------
+@st.cache_data(ttl=5, show_spinner=False)
+def _list_docs():
+    return [f for f in os.listdir(DOCS_DIR) if os.path.splitext(f)[1].lower() in (".pdf", ".txt")]
+
 def diagnostics_panel():
     try:
         from rag.retriever import get_or_create_index
@@ -402,7 +630,7 @@ def diagnostics_panel():
     with st.sidebar.expander("🛠️ Diagnostics", expanded=False):
         import sys
         st.write(f"Python: `{sys.executable}`")
-        files = [f for f in os.listdir(DOCS_DIR) if os.path.splitext(f)[1].lower() in [".pdf", ".txt"]]
+        files = _list_docs()
         st.write(f"Docs: **{len(files)}**")
         if get_or_create_index:
             try:
@@ -418,6 +646,57 @@ def diagnostics_panel():
         else:
             st.write("Retriever not available in this environment")
 
+# -------------------------
+# Chat export
+# -------------------------
+@st.cache_resource(show_spinner=False)
+def _docx_status() -> dict:
+    """Process-wide python-docx availability, probed once instead of every rerun."""
+    try:
+        import docx  # noqa: F401
+        return {"available": True, "error": None, "install": None}
+    except ImportError as e:
+        return {"available": False, "error": str(e), "install": None}
+
+def _pip_install_docx(status: dict):
+    # runs on a daemon thread so the Streamlit worker isn't blocked by pip
+    import subprocess
+    import sys
+    try:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "python-docx"])
+        importlib.invalidate_caches()
+        status.update(available=True, install=None)
+    except Exception as install_err:
+        status["install"] = str(install_err)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _build_docx(email: str, cid: str, n_msgs: int, updated_at: int) -> bytes:
+    # n_msgs/updated_at only key the cache so a changed conversation is rebuilt
+    from docx import Document
+    from io import BytesIO
+
+    act = convo_get(email, cid) or {}
+    doc = Document()
+    doc.add_heading('Legal Chat Export', 0)
+    doc.add_paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    doc.add_paragraph(f"Topic: {act.get('title', 'Untitled')}")
+    doc.add_paragraph("-" * 40)
+    
+    for m in act.get("messages", []):
+        role = m.get("role", "unknown").upper()
+        content = m.get("content", "")
+        timestamp = fmt_time(m.get("ts", 0))
+        
+        p = doc.add_paragraph()
+        p.add_run(f"[{timestamp}] {role}:").bold = True
+        doc.add_paragraph(content)
+        doc.add_paragraph("") # Space between messages
+    
+    # Save to buffer
+    bio = BytesIO()
+    doc.save(bio)
+    return bio.getvalue()
+
 # -------------------------
 # Sidebar: settings, uploads, convos
 # -------------------------
@@ -432,8 +711,8 @@ def sidebar_ui():
             st.markdown("### 🎨 Appearance")
             selected_theme = st.selectbox(
                 "Theme", 
-                options=list(THEME_CONFIG.keys()), 
-                index=list(THEME_CONFIG.keys()).index(st.session_state.get("theme", "Midnight Purple")),
+                options=_THEME_ORDER, 
+                index=_THEME_INDEX.get(st.session_state.get("theme"), 0),
                 label_visibility="collapsed"
             )
             if selected_theme != st.session_state.get("theme"):
@@ -443,11 +722,10 @@ def sidebar_ui():
             # Chat Mode Selector
             st.write("")
             st.markdown("### 🧠 Interaction Mode")
-            modes = ["Normal", "Summary", "Quiz", "ELI5", "Drafting"]
             selected_mode = st.selectbox(
                 "Mode",
-                options=modes,
-                index=modes.index(st.session_state.get("chat_mode", "Normal")),
+                options=CHAT_MODES,
+                index=_MODE_INDEX.get(st.session_state.get("chat_mode"), 0),
                 label_visibility="collapsed"
             )
             if selected_mode != st.session_state.get("chat_mode"):
@@ -460,16 +738,23 @@ def sidebar_ui():
             if st.button("➕ New Chat", use_container_width=True, type="primary"):
                 st.session_state["active_cid"] = convo_create(email); st.rerun()
 
-            convs = convos_load(email); active = st.session_state.get("active_cid")
+            # loaded once per rerun and shared by the list, tools and export sections
+            convs = convos_cached(email); by_id = {c["id"]: c for c in convs}
+            active = st.session_state.get("active_cid")
             if not convs:
                 st.info("No conversations yet.")
             else:
-                # render each convo
-                for c in convs:
-                    # Simple single-column button for selection
-                    label = ("🟢 " if c["id"] == active else "• ") + c["title"]
-                    if st.sidebar.button(label, key=f"sel_{c['id']}", use_container_width=True):
-                        st.session_state["active_cid"] = c["id"]; st.rerun()
+                # one radio widget for the whole list instead of a button per convo
+                ids = list(by_id)
+                choice = st.radio(
+                    "Conversations",
+                    options=ids,
+                    index=ids.index(active) if active in by_id else 0,
+                    format_func=lambda cid: by_id[cid]["title"] or "Untitled",
+                    label_visibility="collapsed",
+                )
+                if choice != active:
+                    st.session_state["active_cid"] = choice; st.rerun()
 
             st.divider()
             st.markdown("### 🧰 Chat Tools")
@@ -486,60 +771,38 @@ def sidebar_ui():
                     cid = st.session_state.get("active_cid")
                     if cid:
                          convo_delete(email, cid)
-                         remaining = convos_load(email)
+                         remaining = [c for c in convs if c["id"] != cid]
                          st.session_state["active_cid"] = remaining[0]["id"] if remaining else None
                          st.rerun()
 
-            # Export functionality
-            act = next((c for c in convos_load(email) if c["id"] == st.session_state.get("active_cid")), None)
+            # Export functionality (the .docx is only built once requested, then cached)
+            act = by_id.get(st.session_state.get("active_cid"))
             if act:
-                try:
-                    from docx import Document
-                    from io import BytesIO
-                except ImportError as e:
-                    Document = None
-                    import_error_msg = str(e)
-
-                if Document:
-                    doc = Document()
-                    doc.add_heading('Legal Chat Export', 0)
-                    doc.add_paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-                    doc.add_paragraph(f"Topic: {act.get('title', 'Untitled')}")
-                    doc.add_paragraph("-" * 40)
-                    
-                    for m in act.get("messages", []):
-                        role = m.get("role", "unknown").upper()
-                        content = m.get("content", "")
-                        timestamp = fmt_time(m.get("ts", 0))
-                        
-                        p = doc.add_paragraph()
-                        p.add_run(f"[{timestamp}] {role}:").bold = True
-                        doc.add_paragraph(content)
-                        doc.add_paragraph("") # Space between messages
-                    
-                    # Save to buffer
-                    bio = BytesIO()
-                    doc.save(bio)
-                    
-                    st.download_button(
-                        label="Export Chat (.docx)",
-                        data=bio.getvalue(),
-                        file_name=f"legal_chat_{datetime.now().strftime('%Y%m%d_%H%M')}.docx",
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                        use_container_width=True
-                    )
+                docx_status = _docx_status()
+                if docx_status["available"]:
+                    if st.session_state.get("export_cid") != act["id"]:
+                        if st.button("Export Chat (.docx)", use_container_width=True):
+                            st.session_state["export_cid"] = act["id"]; st.rerun()
+                    else:
+                        st.download_button(
+                            label="Download Chat (.docx)",
+                            data=_build_docx(email, act["id"], convo_message_count(act["id"]), act["updatedAt"]),
+                            file_name=f"legal_chat_{datetime.now().strftime('%Y%m%d_%H%M')}.docx",
+                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                            use_container_width=True
+                        )
                 else:
-                    st.warning(f"Missing dependency. Error: {import_error_msg}")
-                    if st.button("Fix: Install python-docx"):
-                        try:
-                            import subprocess
-                            import sys
-                            subprocess.check_call([sys.executable, "-m", "pip", "install", "python-docx"])
-                            st.success("Installed! Please refresh the page (F5).")
-                            time.sleep(2)
+                    st.warning(f"Missing dependency. Error: {docx_status['error']}")
+                    if docx_status["install"] == "running":
+                        st.info("Installing python-docx in the background…")
+                        if st.button("Refresh", use_container_width=True): st.rerun()
+                    else:
+                        if docx_status["install"]:
+                            st.error(f"Installation failed: {docx_status['install']}")
+                        if st.button("Fix: Install python-docx"):
+                            docx_status["install"] = "running"
+                            threading.Thread(target=_pip_install_docx, args=(docx_status,), daemon=True).start()
                             st.rerun()
-                        except Exception as install_err:
-                            st.error(f"Installation failed: {install_err}")
 
             st.divider()
             if st.button("Logout", use_container_width=True):
@@ -560,7 +823,9 @@ def sidebar_ui():
                         with open(os.path.join(DOCS_DIR, f.name), "wb") as out:
                             out.write(f.getbuffer()); saved += 1
                     if saved:
+                        _list_docs.clear()
                         st.success(f"Uploaded {saved} file(s).")
+                        clear_answer_cache()
                         try:
                             from rag.retriever import clear_index_cache
                             clear_index_cache()
@@ -574,7 +839,9 @@ def sidebar_ui():
                     for f in os.listdir(DOCS_DIR):
                         fp = os.path.join(DOCS_DIR, f)
                         if os.path.isfile(fp): os.remove(fp)
-                    # Clear index
+                    _list_docs.clear()
+                    # Clear index (and answers built from it)
+                    clear_answer_cache()
                     try:
                         from rag.retriever import clear_index_cache
                         clear_index_cache()
@@ -696,7 +963,7 @@ def signup_view():
                 elif len(pw) < 6: st.error("Password must be at least 6 characters.")
                 elif pw != pw2: st.error("Passwords do not match.")
                 else:
-                    upsert_user({"email": email.strip().lower(), "name": name.strip(), "password_hash": sha256(pw)})
+                    upsert_user({"email": email.strip().lower(), "name": name.strip(), "password_hash": hash_password(pw)})
                     st.success("Account created! Signing you in…")
                     login(email, pw); st.session_state["route"]="chat"; st.rerun()
         if st.button("← Back to sign in"): st.session_state["route"]="login"; st.rerun()
@@ -747,7 +1014,7 @@ def reset_view():
                     u = find_user(email)
                     if not u: st.error("Account not found.")
                     else:
-                        u["password_hash"]=sha256(newp); upsert_user(u)
+                        u["password_hash"]=hash_password(newp); upsert_user(u)
                         st.session_state.reset_codes.pop(email.lower(), None)
                         st.success("Password updated! Please sign in.")
                         st.session_state.pop("pending_reset_email", None)
@@ -757,12 +1024,89 @@ def reset_view():
 # -------------------------
 # Chat helpers & rendering
 # -------------------------
-def render_bubble(role: str, content: str, ts: float = None, animate: bool = True, suggestions: list = None, key_prefix: str = ""):
-    # Use markdown to render content to HTML
+# -------------------------
+# Lazy heavy imports (login screen never needs them)
+# -------------------------
+@st.cache_resource(show_spinner=False)
+def _markdown():
+    # one converter reused via reset(); building a Markdown per call re-registers
+    # the whole extension pipeline
+    import markdown
+    return markdown.Markdown(extensions=["extra"])
+
+@st.cache_resource(show_spinner=False)
+def _answer_query_stream():
+    # import your backend answer function (must exist in project)
+    from rag.answer import answer_query_stream
+    return answer_query_stream
+
+# Answers to repeated questions (starter buttons, common queries), shared by all
+# sessions. Streaming can't go through st.cache_data, so this is a small TTL'd
+# LRU parked in cache_resource; it is dropped whenever the index changes.
+ANSWER_CACHE_TTL = 3600
+ANSWER_CACHE_MAX = 512
+
+@st.cache_resource(show_spinner=False)
+def _answer_cache() -> "collections.OrderedDict":
+    return collections.OrderedDict()
+
+def _answer_key(query: str, mode: str) -> tuple:
+    return (" ".join(query.split()).lower(), mode)
+
+def cached_answer(query: str, mode: str):
+    key = _answer_key(query, mode)
+    with shared_lock("answers"):
+        cache = _answer_cache()
+        hit = cache.get(key)
+        if hit is None:
+            return None
+        if time.time() - hit[0] > ANSWER_CACHE_TTL:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return hit[1]
+
+def cache_answer(query: str, mode: str, resp: dict):
+    key, cache = _answer_key(query, mode), _answer_cache()
+    with shared_lock("answers"):
+        cache[key] = (time.time(), resp)
+        cache.move_to_end(key)
+        while len(cache) > ANSWER_CACHE_MAX:
+            cache.popitem(last=False)
+
+def clear_answer_cache():
+    with shared_lock("answers"):
+        _answer_cache().clear()
+
+def _warm_rag_backend():
     try:
-        content_html = markdown.markdown(content)
+        _answer_query_stream()
+        from rag.retriever import get_or_create_index
+        get_or_create_index()
     except Exception:
-        content_html = esc(content).replace("\n", "<br>")
+        pass  # the first question surfaces any real error
+
+@st.cache_resource(show_spinner=False)
+def _rag_warmup() -> threading.Thread:
+    # Load the backend + index off the script thread while the user is typing, so
+    # the first question only waits on retrieval and the model. cache_resource's
+    # per-key lock makes a question asked mid-warmup wait instead of loading twice.
+    t = threading.Thread(target=_warm_rag_backend, daemon=True)
+    t.start()
+    return t
+
+@persistent_lru(maxsize=4096)
+def _md_to_html(content: str) -> str:
+    # history is replayed on every rerun; convert (or escape) each message only once
+    try:
+        with shared_lock("markdown"):  # the converter keeps per-conversion state
+            return _markdown().reset().convert(content)
+    except Exception:
+        return html.escape(content).replace("\n", "<br>")
+
+def render_bubble(role: str, content: str, ts: float = None, animate: bool = True, suggestions: list = None, key_prefix: str = ""):
+    # Use markdown to render content to HTML
+    content_html = _md_to_html(content)
     
     timestamp = f'<div class="timestamp">{fmt_time(ts)}</div>' if ts else ""
     if role == "user":
@@ -877,16 +1221,18 @@ def chat_view():
         st.error("Please sign in to use the assistant.")
         return
 
+    _rag_warmup()
+
     email = user["email"]
-    convs = convos_load(email)
+    convs = convos_cached(email)
     if not convs:
         st.session_state["active_cid"] = convo_create(email)
-        convs = convos_load(email)
+        convs = convos_cached(email)
 
     active_cid = st.session_state.get("active_cid") or (convs[0]["id"] if convs else convo_create(email))
-    active = next((c for c in convs if c["id"] == active_cid), None)
+    active = convo_cached(email, active_cid)
     if active is None:
-        active = convs[0] if convs else None
+        active = convo_cached(email, convs[0]["id"]) if convs else None
         st.session_state["active_cid"] = active["id"] if active else None
 
     if active:
@@ -896,9 +1242,17 @@ def chat_view():
             convo_append_msg(email, active["id"], "user", sc)
             st.rerun()
 
-        # Render messages
-        for i, m in enumerate(active["messages"]):
-            is_last = (i == len(active["messages"]) - 1)
+        # Render messages (only the most recent window; older ones on demand)
+        msgs = active["messages"]
+        window_n = st.session_state.get("window_n", CHAT_WINDOW)
+        start = max(0, len(msgs) - window_n)
+        if start:
+            if st.button(f"⬆️ Load earlier messages ({start} hidden)", key=f"more_{active['id']}", use_container_width=True):
+                st.session_state["window_n"] = window_n + CHAT_WINDOW
+                st.rerun()
+        for i in range(start, len(msgs)):
+            m = msgs[i]
+            is_last = (i == len(msgs) - 1)
             sugs = m.get("suggestions") if is_last else None
             render_bubble(m["role"], m["content"], ts=m.get("ts"), animate=False, suggestions=sugs, key_prefix=f"{active['id']}_{i}")
 
@@ -969,7 +1323,22 @@ def chat_view():
         user_query = active["messages"][-1]["content"]
         try:
             mode = st.session_state.get("chat_mode", "Normal")
-            resp = answer_query(user_query, mode=mode)
+            resp = cached_answer(user_query, mode)
+            if resp is None:
+                # Stream tokens into the placeholder; the generator returns the final dict
+                stream = _answer_query_stream()(user_query, mode=mode)
+                buf = []
+                while True:
+                    try:
+                        buf.append(next(stream))
+                    except StopIteration as stop:
+                        resp = stop.value
+                        break
+                    partial = html.escape("".join(buf)).replace("\n", "<br>")
+                    placeholder.markdown(f'<div class="chat-row assistant"><div class="bubble assistant">{partial}</div></div>', unsafe_allow_html=True)
+                # only finished LLM answers: not cut-off streams, failure replies or local fallbacks
+                if isinstance(resp, dict) and resp.get("complete"):
+                    cache_answer(user_query, mode, resp)
             
             if isinstance(resp, str):
                 reply = resp
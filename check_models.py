@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 from dotenv import load_dotenv
 import openai
 
@@ -13,33 +14,46 @@ if not api_key:
     print("No API Key found.")
     sys.exit(1)
 
-client = openai.OpenAI(api_key=api_key)
+client = openai.AsyncOpenAI(api_key=api_key)
 
 models_to_test = ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo", "gpt-4"]
 
-print("\n--- Testing Model Access ---")
-success_model = None
-
-for model in models_to_test:
-    print(f"Testing {model}...", end=" ")
+async def probe(model):
+    """Returns (model, exception or None)."""
     try:
-        client.chat.completions.create(
+        await client.chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": "hi"}],
             max_tokens=1
         )
+        return model, None
+    except Exception as e:
+        return model, e
+
+async def probe_all():
+    # One round-trip of wall time instead of one per model
+    return await asyncio.gather(*map(probe, models_to_test))
+
+print("\n--- Testing Model Access ---")
+success_model = None
+
+results = asyncio.run(probe_all())
+if any(isinstance(err, openai.AuthenticationError) for _, err in results):
+    print("FAILED (401 - Invalid Key) ❌")
+    sys.exit(1) # No point reporting per-model results
+
+for model, err in results:
+    print(f"Testing {model}...", end=" ")
+    if err is None:
         print("SUCCESS! ✅")
-        success_model = model
-        break
-    except openai.AuthenticationError:
-        print("FAILED (401 - Invalid Key) ❌")
-        break # No point testing other models
-    except openai.PermissionDeniedError:
+        # models_to_test is in preference order, so keep the first success
+        success_model = success_model or model
+    elif isinstance(err, openai.PermissionDeniedError):
         print("FAILED (403 - Permission Denied) 🚫")
-    except openai.NotFoundError:
+    elif isinstance(err, openai.NotFoundError):
          print("FAILED (404 - Model Not Found/No Access) 🚫")
-    except Exception as e:
-        print(f"FAILED ({type(e).__name__}) ⚠️")
+    else:
+        print(f"FAILED ({type(err).__name__}) ⚠️")
 
 if success_model:
     print(f"\nRecommended Action: Update .env to use OPENAI_MODEL={success_model}")
@@ -3,7 +3,7 @@
 Chunking script: breaks cleaned text into section-wise chunks.
 - Reads files from data/processed/clean_text/
 - Splits text by the _HEADING_ marker.
-- Saves each chunk to data/chunks/
+- Saves each document's chunks as one JSONL file in data/chunks/
 - Creates a manifest.json file mapping original documents to their chunks.
 """
 
@@ -23,42 +23,46 @@ def create_chunks(cleaned_file_path):
 
     # Split the content by the heading marker
     # The first element will be the text before the first heading, which we can ignore or label as a preamble
-    sections = content.split("\n_HEADING_ ")[1:]
+    marker = "\n_HEADING_ "
+    preamble, *sections = content.split(marker)
     
     # Extract the base filename
     base_name = os.path.splitext(os.path.basename(cleaned_file_path))[0]
     
+    # All chunks of a document go to one JSONL file (one line per chunk) instead
+    # of one small file each
+    chunk_filename = f"{base_name}.chunks.jsonl"
+    chunk_path = os.path.join(CHUNKS_DIR, chunk_filename)
+
     chunks = []
-    for i, section in enumerate(sections):
-        # The first line of the section is the heading, the rest is the content
-        heading_line, *rest_of_content = section.split("\n", 1)
-        
-        chunk_content = heading_line + "\n" + "".join(rest_of_content)
-        chunk_filename = f"{base_name}_chunk_{i+1}.txt"
-        chunk_path = os.path.join(CHUNKS_DIR, chunk_filename)
-        
-        with open(chunk_path, "w", encoding="utf-8") as f:
-            f.write(chunk_content.strip())
-            
-        chunks.append({
-            "chunk_filename": chunk_filename,
-            "chunk_path": chunk_path,
-            "heading": heading_line.strip(),
-            "start_index": content.find(heading_line) # Simple index for tracking
-        })
+    offset = len(preamble) + len(marker)  # start of the current section's heading in content
+    with open(chunk_path, "w", encoding="utf-8") as out:
+        for i, section in enumerate(sections):
+            # The first line of the section is the heading, the rest is the content
+            heading_line = section.split("\n", 1)[0]
+
+            out.write(json.dumps({"i": i, "heading": heading_line.strip(), "text": section.strip()}, ensure_ascii=False) + "\n")
+
+            chunks.append({
+                "chunk_filename": chunk_filename,
+                "chunk_path": chunk_path,
+                "line": i, # Line of this chunk in chunk_path
+                "heading": heading_line.strip(),
+                "start_index": offset # Simple index for tracking
+            })
+            offset += len(section) + len(marker)
         
     return chunks
 
 def run_chunking():
     all_chunk_mappings = {}
-    for fname in os.listdir(CLEAN_TEXT_DIR):
-        if not fname.endswith(".txt"):
-            continue
-            
-        cleaned_path = os.path.join(CLEAN_TEXT_DIR, fname)
+    with os.scandir(CLEAN_TEXT_DIR) as it:
+        entries = [e for e in it if e.name.endswith(".txt") and e.is_file()]
+    for entry in entries:
+        fname = entry.name
         
         # Create chunks for the current file
-        document_chunks = create_chunks(cleaned_path)
+        document_chunks = create_chunks(entry.path)
         
         # Add the mapping to the main dictionary
         all_chunk_mappings[fname] = document_chunks
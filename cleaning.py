@@ -8,6 +8,7 @@ Cleaning script: produce plain text only.
 import os
 import re
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 RAW_TEXT_DIR = "data/processed/raw_text"
 CLEAN_TEXT_DIR = "data/processed/clean_text"
@@ -17,45 +18,42 @@ os.makedirs(CLEAN_TEXT_DIR, exist_ok=True)
 def fix_hyphenation(lines):
     """Join words broken with hyphen at line end."""
     fixed = []
-    skip = False
-    for i, line in enumerate(lines):
-        if skip:
-            skip = False
-            continue
-        if line.endswith("-") and i + 1 < len(lines):
-            fixed.append(line[:-1] + lines[i+1].lstrip())
-            skip = True
+    i = 0
+    while i < len(lines):
+        if lines[i].endswith("-") and i + 1 < len(lines):
+            fixed.append(lines[i][:-1] + lines[i+1].lstrip())
+            i += 2
         else:
-            fixed.append(line)
+            fixed.append(lines[i])
+            i += 1
     return fixed
 
-def detect_headers_footers(all_pages):
-    """Find frequent top/bottom lines across pages."""
-    tops, bottoms = [], []
-    for page in all_pages:
-        if not page: continue
-        tops.append(page[0])
-        bottoms.append(page[-1])
-    top_counts = Counter(tops)
-    bot_counts = Counter(bottoms)
-    headers = {t for t, c in top_counts.items() if c > 2}
-    footers = {b for b, c in bot_counts.items() if c > 2}
+def detect_headers_footers(all_pages, min_repeats=2):
+    """Find top/bottom lines repeated on more than `min_repeats` pages."""
+    top_counts = Counter(p[0] for p in all_pages if p)
+    bot_counts = Counter(p[-1] for p in all_pages if p)
+    headers = frozenset(t for t, c in top_counts.items() if c > min_repeats)
+    footers = frozenset(b for b, c in bot_counts.items() if c > min_repeats)
     return headers, footers
 
+# Compiled once; process_line runs for every line of every document
+_HEAD_RE = re.compile(r"^(CHAPTER|SECTION|ARTICLE|PART)\b", flags=re.I)
+# Leading bullets, then optional leading numbering, stripped in one pass
+_PREFIX_RE = re.compile(r"^[\u2022\u2023\u25E6\u2043\u2219\-\●\•\▪\▫\‣]*(?:\s*\(?[0-9ivxlcIVXLCa-zA-Z]+\)?[\.\)]\s*)?")
+_SPACE_RE = re.compile(r"\s+")
+
 def process_line(line: str):
     """
     Identifies and formats headings.
     Removes bullets and numbering from regular text.
     """
+    s = line.strip()
     # Check for headings like CHAPTER I, SECTION 302, etc.
-    if re.match(r"^(CHAPTER|SECTION|ARTICLE|PART)\b", line.strip(), flags=re.I):
-        return f"\n_HEADING_ {line.strip()}\n" # Preserve heading with a marker
+    if _HEAD_RE.match(s):
+        return f"\n_HEADING_ {s}\n" # Preserve heading with a marker
 
     # Remove bullet characters and leading numbering from regular text
-    line = re.sub(r"^[\u2022\u2023\u25E6\u2043\u2219\-\●\•\▪\▫\‣]+", "", line)
-    line = re.sub(r"^\s*(\(?[0-9ivxlcIVXLCa-zA-Z]+\)?[\.\)])\s*", "", line)
-
-    return line.strip()
+    return _PREFIX_RE.sub("", s, count=1).strip()
 
 def clean_text(raw_text):
     pages = [p.splitlines() for p in raw_text.split("\f")]
@@ -63,40 +61,40 @@ def clean_text(raw_text):
 
     processed_lines = []
     for page in pages:
-        for line in page:
-            line = line.strip()
-            if not line or line in headers or line in footers:
-                continue
+        # Fix hyphenation on the page's real line list, before lines are joined
+        lines = [line.strip() for line in page]
+        lines = [line for line in lines if line and line not in headers and line not in footers]
+        for line in fix_hyphenation(lines):
             processed_line = process_line(line)
             if not processed_line:
                 continue
             processed_lines.append(processed_line)
 
-    # Join and normalize, then fix hyphenation on the result
+    # Join and normalize
     text = " ".join(processed_lines)
-    text = re.sub(r"\s+", " ", text) # Normalize spaces
+    text = _SPACE_RE.sub(" ", text) # Normalize spaces
     
-    # Fix hyphenation on the full, processed text
-    lines_for_hyphenation = text.split("\n")
-    fixed_lines = fix_hyphenation(lines_for_hyphenation)
-    
-    return "\n".join(fixed_lines).strip()
+    return text.strip()
 
-def run_cleaning():
-    for fname in os.listdir(RAW_TEXT_DIR):
-        if not fname.endswith(".txt"):
-            continue
-        raw_path = os.path.join(RAW_TEXT_DIR, fname)
-        with open(raw_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
+def _clean_one(fname):
+    raw_path = os.path.join(RAW_TEXT_DIR, fname)
+    with open(raw_path, "r", encoding="utf-8") as f:
+        raw_text = f.read()
 
-        cleaned = clean_text(raw_text)
+    cleaned = clean_text(raw_text)
 
-        out_path = os.path.join(CLEAN_TEXT_DIR, fname)
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(cleaned)
+    out_path = os.path.join(CLEAN_TEXT_DIR, fname)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(cleaned)
+    return out_path
 
-        print(f"[+] Cleaned file saved: {out_path}")
+def run_cleaning():
+    # Files are independent and the work is CPU-bound Python, so use processes
+    with os.scandir(RAW_TEXT_DIR) as it:
+        fnames = [e.name for e in it if e.name.endswith(".txt") and e.is_file()]
+    with ProcessPoolExecutor() as ex:
+        for out_path in ex.map(_clean_one, fnames):
+            print(f"[+] Cleaned file saved: {out_path}")
 
 if __name__ == "__main__":
-    run_cleaning()
\ No newline at end of file
+    run_cleaning()
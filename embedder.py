@@ -1,5 +1,9 @@
 import os
+import hashlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter 
@@ -9,18 +13,40 @@ load_dotenv()
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 800))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 80))
+# Chunk length in embedding-model tokens (CHUNK_SIZE/CHUNK_OVERLAP are the
+# character fallback when the tokenizer can't be loaded)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 256))
+CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", 32))
+SPLIT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
 
 BASE_DIR = Path(__file__).parent 
 DATA_DIR = BASE_DIR / "data" / "processed" / "raw_text" 
-OUTPUT_CSV_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.csv" 
+# Chunk metadata (id/text/source/page) goes to Parquet; the vectors go to a
+# float32 .npy whose row i belongs to Parquet row i (loadable with mmap_mode="r").
+OUTPUT_PARQUET_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.parquet"
+OUTPUT_NPY_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.npy"
 
+def make_text_splitter():
+    """Splitter measuring chunks in the embedding model's tokens, so chunks fit its max sequence length."""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+        return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            tokenizer,
+            chunk_size=CHUNK_TOKENS,
+            chunk_overlap=CHUNK_TOKEN_OVERLAP,
+            separators=SPLIT_SEPARATORS
+        )
+    except Exception as e:
+        print(f"Tokenizer for {EMBEDDING_MODEL_NAME} unavailable ({e}); splitting by characters.")
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=SPLIT_SEPARATORS
+        )
 def load_documents_and_chunk(data_dir):
     all_chunks = []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    text_splitter = make_text_splitter()
     text_files = glob.glob(str(data_dir / "*.txt"))
     if not text_files:
         print(f"ERROR: '{data_dir.resolve()}' exists, but contains no .txt files to process.")
@@ -46,21 +72,77 @@ def load_documents_and_chunk(data_dir):
             print(f"Failed to read or process {filename}: {e}")
             continue
     return all_chunks
+def load_embedding_model():
+    """Load the SentenceTransformer on GPU in fp16 when available; returns (model, batch_size)."""
+    import torch
+    if torch.cuda.is_available():
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cuda")
+        model.half()
+        return model, 128
+    torch.set_num_threads(os.cpu_count() or 1)
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu"), 64
+def content_hash(text):
+    """Cache key for a chunk's embedding: the text plus the model that embedded it."""
+    return hashlib.blake2b(f"{EMBEDDING_MODEL_NAME}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+def load_previous_embeddings():
+    """{content_hash: embedding row} from the last run's Parquet/.npy pair, or {} if absent or unusable."""
+    try:
+        prev = pd.read_parquet(OUTPUT_PARQUET_PATH, columns=["content_hash"])
+        vectors = np.load(OUTPUT_NPY_PATH, mmap_mode="r")
+    except Exception:
+        return {}
+    if len(prev) != len(vectors):
+        return {}
+    return {h: vectors[i] for i, h in enumerate(prev["content_hash"])}
+CHUNK_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("text", pa.string()),
+    ("source", pa.string()),
+    ("page", pa.int64()),
+    ("content_hash", pa.string()),
+])
+def write_chunk_parquet(chunks, hashes, batch_size=1000):
+    """Streams chunk metadata to Parquet in row batches instead of building one DataFrame."""
+    with pq.ParquetWriter(OUTPUT_PARQUET_PATH, CHUNK_SCHEMA, compression="zstd") as writer:
+        for start in range(0, len(chunks), batch_size):
+            rows = [
+                {"id": c["id"], "text": c["text"], "source": c["source"], "page": c["page"], "content_hash": h}
+                for c, h in zip(chunks[start:start + batch_size], hashes[start:start + batch_size])
+            ]
+            writer.write_table(pa.Table.from_pylist(rows, schema=CHUNK_SCHEMA))
 def create_and_save_embeddings(chunks):
-    """Initializes the embedding model, creates vectors, and saves them locally."""
+    """Initializes the embedding model, creates vectors (reusing ones for unchanged chunks), and saves them locally."""
     if not chunks:
         return
-    print(f"Loading embedding model: {EMBEDDING_MODEL_NAME}...")
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    texts = [chunk["text"] for chunk in chunks]
-    embeddings = model.encode(texts).tolist()
-    for chunk, embedding in zip(chunks, embeddings):
-        chunk["embedding"] = embedding
-    os.makedirs(OUTPUT_CSV_PATH.parent, exist_ok=True)
-    df = pd.DataFrame(chunks)
-    df.to_csv(OUTPUT_CSV_PATH, index=False)
-    print(f"Successfully generated and saved {len(chunks)} embeddings to {OUTPUT_CSV_PATH.resolve()}")
+    hashes = [content_hash(chunk["text"]) for chunk in chunks]
+    previous = load_previous_embeddings()
+    to_embed = [i for i, h in enumerate(hashes) if h not in previous]
+    print(f"Reusing {len(chunks) - len(to_embed)} cached embeddings; {len(to_embed)} chunks to embed.")
+    fresh = None
+    if to_embed:
+        print(f"Loading embedding model: {EMBEDDING_MODEL_NAME}...")
+        model, batch_size = load_embedding_model()
+        fresh = model.encode(
+            [chunks[i]["text"] for i in to_embed],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=True
+        ).astype(np.float32)
+    dim = fresh.shape[1] if fresh is not None else len(next(iter(previous.values())))
+    embeddings = np.empty((len(chunks), dim), dtype=np.float32)
+    if fresh is not None:
+        embeddings[to_embed] = fresh
+    for i, h in enumerate(hashes):
+        if h in previous:
+            embeddings[i] = previous[h]
+    del previous  # release the old .npy mmap before np.save rewrites that file
+    os.makedirs(OUTPUT_PARQUET_PATH.parent, exist_ok=True)
+    write_chunk_parquet(chunks, hashes)
+    np.save(OUTPUT_NPY_PATH, embeddings)
+    print(f"Successfully generated and saved {len(chunks)} embeddings to {OUTPUT_NPY_PATH.resolve()}")
+    return embeddings
 if __name__ == "__main__":
     document_chunks = load_documents_and_chunk(DATA_DIR)
-    create_and_save_embeddings(document_chunks)
+    embeddings = create_and_save_embeddings(document_chunks)
     print("\nEmbedding generation pipeline finished. Next: Upload to Pinecone.")
\ No newline at end of file
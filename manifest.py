@@ -21,12 +21,18 @@ MANIFEST_FILE = "data/processed/manifest.jsonl"
 os.makedirs(REPO_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
 
+# Lines that start with the special heading marker added by the cleaning script
+_HEADING_RE = re.compile(r"^_HEADING_(.*)$", re.M)
+
 def sha256_file(path):
     """Compute sha256 checksum for a file."""
-    h = hashlib.sha256()
     with open(path, "rb") as f:
-        # Read the file in chunks for memory efficiency
-        for chunk in iter(lambda: f.read(8192), b""):
+        # hashlib.file_digest (Python 3.11+) reads and hashes in C
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        # Read the file in large chunks for memory efficiency
+        for chunk in iter(lambda: f.read(1 << 20), b""):
             h.update(chunk)
     return h.hexdigest()
 
@@ -52,30 +58,30 @@ def extract_headings_from_text(text_path):
     if os.path.exists(text_path):
         with open(text_path, "r", encoding="utf-8") as f:
             content = f.read()
-            # Find all lines that start with the special heading marker
-            for line in content.splitlines():
-                if line.startswith("_HEADING_"):
-                    # Remove the marker and strip whitespace to get the clean heading
-                    headings.append(line.replace("_HEADING_", "").strip())
+        # Scan for marker lines in a single regex pass and keep the clean heading
+        headings = [m.group(1).strip() for m in _HEADING_RE.finditer(content)]
     return headings
 
 def build_manifest():
     manifest_entries = []
 
-    for fname in os.listdir(RAW_DIR):
-        if not fname.lower().endswith(".pdf"):
-            continue
+    with os.scandir(RAW_DIR) as it:
+        entries = [e for e in it if e.name.lower().endswith(".pdf") and e.is_file()]
 
-        raw_path = os.path.join(RAW_DIR, fname)
+    for entry in entries:
+        fname = entry.name
+        raw_path = entry.path
         repo_path = os.path.join(REPO_DIR, fname)
 
         # Copy PDF to secure repository if not already copied
         if not os.path.exists(repo_path):
             shutil.copy2(raw_path, repo_path)
+            size_bytes = entry.stat().st_size  # copy2 keeps the size; reuse the cached stat
+        else:
+            size_bytes = os.path.getsize(repo_path)
 
-        # Calculate integrity metrics (hash + size)
+        # Calculate integrity hash
         file_hash = sha256_file(repo_path)
-        size_bytes = os.path.getsize(repo_path)
 
         # Determine the expected path for the cleaned text
         clean_txt_path = os.path.join(
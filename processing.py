@@ -1,6 +1,7 @@
 # src/ingestion/processing.py
 
 import os
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 from pdfminer.high_level import extract_text as pdfminer_extract
 
@@ -9,41 +10,41 @@ RAW_TEXT_DIR = "data/processed/raw_text"
 
 os.makedirs(RAW_TEXT_DIR, exist_ok=True)
 
-def extract_pdf_content(pdf_path):
+def extract_pdf_to_file(pdf_path, out_path):
     """
-    Extracts text and metadata from a PDF.
-    Tries PyMuPDF first, with a fallback to pdfminer.
+    Streams a PDF's text page by page into out_path (no full-document string).
+    Tries PyMuPDF first, with a fallback to pdfminer. Returns the PDF metadata.
     """
-    metadata = {}
     try:
-        with fitz.open(pdf_path) as doc:
-            text = "\n".join([page.get_text("text") for page in doc])
-            metadata = doc.metadata  # Capture metadata here
-            return text, metadata
+        with fitz.open(pdf_path) as doc, open(out_path, "w", encoding="utf-8") as f:
+            for i, page in enumerate(doc):
+                if i:
+                    f.write("\n")
+                f.write(page.get_text("text"))
+            return doc.metadata
     except Exception:
         # Fallback to pdfminer
-        return pdfminer_extract(pdf_path), {}
-
-def process_pdfs():
-    """Loop through PDFs and save raw text outputs."""
-    for fname in os.listdir(RAW_DIR):
-        if not fname.lower().endswith(".pdf"):
-            continue
-        pdf_path = os.path.join(RAW_DIR, fname)
-        
-        # Extract both text and metadata
-        text, metadata = extract_pdf_content(pdf_path)
-
-        out_path = os.path.join(
-            RAW_TEXT_DIR, os.path.splitext(fname)[0] + ".txt"
-        )
+        text = pdfminer_extract(pdf_path)
         with open(out_path, "w", encoding="utf-8") as f:
             f.write(text)
+        return {}
+
+def _process_one(fname):
+    pdf_path = os.path.join(RAW_DIR, fname)
+    out_path = os.path.join(
+        RAW_TEXT_DIR, os.path.splitext(fname)[0] + ".txt"
+    )
+    # Metadata is handled by the manifest script, which is the central registry.
+    extract_pdf_to_file(pdf_path, out_path)
+    return out_path
 
-        print(f"[+] Saved raw text: {out_path}")
-        # Here you could potentially pass the metadata to the next stage,
-        # but for simplicity, we'll handle it in the manifest script
-        # which is the central registry.
+def process_pdfs():
+    """Extract all PDFs in parallel (one process per file) and save raw text outputs."""
+    with os.scandir(RAW_DIR) as it:
+        pdfs = [e.name for e in it if e.name.lower().endswith(".pdf") and e.is_file()]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        for out_path in ex.map(_process_one, pdfs):
+            print(f"[+] Saved raw text: {out_path}")
         
 if __name__ == "__main__":
-    process_pdfs()
\ No newline at end of file
+    process_pdfs()
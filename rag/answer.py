@@ -6,13 +6,21 @@
 # - Supports both old openai (<1.0 ChatCompletion) and new openai>=1.0 clients.
 # - Debug logging of top retrieved snippets and relevance heuristic.
 # - answer_query(query, top_k, verbose, use_llm) supports toggles.
+# - answer_queries(queries, ...) answers several questions per LLM call for bulk runs.
 
 import os
+import re
 import logging
+import threading
 import traceback
 import time
 import pprint
-from typing import List, Dict, Any, Optional
+import asyncio
+import functools
+import weakref
+from typing import List, Dict, Any, Optional, Iterator, Generator
+
+from rag.query_cache import QueryCache
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +33,12 @@ try:
 except Exception:
     _openai_pkg = None
 
+# Optional: exact token counts for the context budget
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
 # For openai>=1.0, there may be an OpenAI client class
 try:
     from openai import OpenAI as OpenAIClient  # type: ignore
@@ -41,7 +55,20 @@ OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.0"))
 # Increase TOP_K and MAX_CHARS for debugging / better context (reduce later if costly)
 TOP_K = int(os.getenv("RAG_TOP_K", "10"))
 MAX_CHARS_FROM_DOCS = int(os.getenv("MAX_CHARS_FROM_DOCS", "6000"))
+# Context budget in model tokens when tiktoken is installed (~ the 6000-char default);
+# MAX_CHARS_FROM_DOCS is the fallback without it
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "1500"))
+# Retrieved passages scoring below this are never sent to the LLM
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.3"))
+# Passages whose word sets overlap an earlier passage by more than this are dropped
+DEDUP_JACCARD = float(os.getenv("DEDUP_JACCARD", "0.8"))
 RAG_VERBOSE = os.getenv("RAG_VERBOSE", "0") == "1"
+# LLM answer cache (exact + semantic); see rag/query_cache.py
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Questions packed into one LLM call by answer_queries
+BATCH_ANSWER_SIZE = int(os.getenv("BATCH_ANSWER_SIZE", "8"))
 
 if OPENAI_API_KEY and _openai_pkg is None:
     logger.warning("OPENAI_API_KEY set but 'openai' package is not installed.")
@@ -92,15 +119,30 @@ def _try_get_retriever_functions():
                             return _normalize_retriever_result(res)
                         except Exception as e:
                             logger.debug(f"retriever idx.{method} failed: {e}")
-            # fallback: naive scan of idx.chunks
+            # fallback: keyword lookup over idx.chunks
             try:
-                chunks = getattr(idx, "chunks", []) or []
-                results = []
+                postings, texts, lowered = _fallback_keyword_index(idx)
                 ql = q.lower()
-                for c in chunks:
-                    text = c.get("text") or c.get("content") or str(c)
-                    score = 1.0 if ql in text.lower() else 0.0
-                    results.append({"source": c.get("source", "unknown"), "text": text, "score": score})
+                terms = set(_WORD_RE.findall(ql))
+                if not terms:
+                    return []
+                # substring match, as the plain scan did ("murd" -> "murder", "302" ->
+                # "302a"): a query word found in the text lies inside one text token,
+                # so union the postings of every indexed token containing it
+                candidates = None
+                for t in terms:
+                    hits = set()
+                    for token, rows in postings.items():
+                        if t in token:
+                            hits |= rows
+                    candidates = hits if candidates is None else candidates & hits
+                    if not candidates:
+                        return []
+                results = []
+                for i in candidates:
+                    # whole phrase present ranks above "all terms somewhere"
+                    score = 1.0 if ql in lowered[i] else 0.5
+                    results.append({"source": texts[i][0], "text": texts[i][1], "score": score})
                 results.sort(key=lambda x: x.get("score", 0.0), reverse=True)
                 return results[:k]
             except Exception:
@@ -111,6 +153,35 @@ def _try_get_retriever_functions():
     return None
 
 
+# idx -> inverted index for the keyword fallback, built on first use
+# idx -> (chunk count, built); weak keys so a rebuilt index lets the old one go
+_fallback_index_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _fallback_keyword_index(idx):
+    """({term: {chunk positions}}, [(source, text)], [lowered text]) for idx.chunks, cached per index object."""
+    chunks = getattr(idx, "chunks", []) or []
+    try:
+        cached = _fallback_index_cache.get(idx)
+    except TypeError:  # not weak-referenceable: build every time
+        cached = None
+    if cached is not None and cached[0] == len(chunks):
+        return cached[1]
+    postings: Dict[str, set] = {}
+    texts, lowered = [], []
+    for i, c in enumerate(chunks):
+        text = c.get("text") or c.get("content") or str(c)
+        texts.append((c.get("source", "unknown"), text))
+        lowered.append(text.lower())
+        for term in set(_WORD_RE.findall(lowered[-1])):
+            postings.setdefault(term, set()).add(i)
+    built = (postings, texts, lowered)
+    try:
+        _fallback_index_cache[idx] = (len(chunks), built)
+    except TypeError:
+        pass
+    return built
+
+
 def _normalize_retriever_result(res):
     out = []
     try:
@@ -124,9 +195,12 @@ def _normalize_retriever_result(res):
                     if isinstance(real_item, dict):
                         src = real_item.get("source") or real_item.get("filename") or "unknown"
                         txt = real_item.get("text") or real_item.get("content") or str(real_item)
-                        out.append({"source": src, "text": txt, "score": score})
+                        entry = {"source": src, "text": txt, "score": score}
                     else:
-                        out.append({"source": "unknown", "text": str(real_item), "score": score})
+                        entry = {"source": "unknown", "text": str(real_item), "score": score}
+                    if len(item) >= 3:
+                        entry["score_max"] = item[2]  # weight of the branches that scored it
+                    out.append(entry)
                     continue
 
                 if isinstance(item, str):
@@ -142,6 +216,9 @@ def _normalize_retriever_result(res):
                     txt = getattr(item, "text", None) or getattr(item, "page_content", None) or str(item)
                     sc = getattr(item, "score", None)
                     out.append({"source": src or "unknown", "text": txt, "score": sc})
+            # lowercased once here; the relevance heuristic and local summary reuse it
+            for r in out:
+                r["text_lower"] = r["text"].lower() if isinstance(r["text"], str) else ""
             return out
         return [{"source": "unknown", "text": str(res), "score": None}]
     except Exception:
@@ -151,30 +228,84 @@ def _normalize_retriever_result(res):
 # --------------------
 # Context builder (concise)
 # --------------------
+def _above_cutoff(retrieved: List[Dict[str, Any]], min_score: float = RAG_MIN_SCORE) -> List[Dict[str, Any]]:
+    # results without a score (retrievers that don't report one) are kept. The
+    # cutoff is relative to the hybrid scale: scaled by score_max, the weight of
+    # the branches that actually scored the result (e.g. 0.3 for TF-IDF only)
+    return [r for r in retrieved
+            if r.get("score") is None or r["score"] >= min_score * r.get("score_max", 1.0)]
+
+def _near_duplicate(sig: frozenset, seen: List[frozenset], threshold: float = DEDUP_JACCARD) -> bool:
+    for other in seen:
+        union = len(sig | other)
+        if union and len(sig & other) / union > threshold:
+            return True
+    return False
+
+@functools.lru_cache(maxsize=1)
+def _token_encoder():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(OPENAI_MODEL)
+    except KeyError:
+        pass  # model unknown to this tiktoken version
+    except Exception:
+        logger.warning("tiktoken encoding unavailable; budgeting context by characters.")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # e.g. the BPE file can't be downloaded offline
+        logger.warning("tiktoken encoding unavailable; budgeting context by characters.")
+        return None
+
+@functools.lru_cache(maxsize=4096)
+def _count_tokens(text: str) -> int:
+    return len(_token_encoder().encode(text))
+
 def build_context_block(retrieved: List[Dict[str, Any]], query: str, max_chars=MAX_CHARS_FROM_DOCS):
+    retrieved = _above_cutoff(retrieved)
     if not retrieved:
         return "", []
+    enc = _token_encoder()
+    if enc is not None:
+        budget, min_piece, size = MAX_CONTEXT_TOKENS, 10, _count_tokens
+        clip = lambda t, n: enc.decode(enc.encode(t)[:n])
+    else:
+        budget, min_piece, size = max_chars, 40, len
+        clip = lambda t, n: t[:n]
     pieces = []
     sources = []
+    seen: List[frozenset] = []
     total = 0
-    for i, r in enumerate(retrieved[:TOP_K]):
+    for r in retrieved:
+        if len(pieces) >= TOP_K:
+            break
         text = (r.get("text") or "").strip()
         src = r.get("source") or "unknown"
         snippet = text[:700].strip()
-        add = f"[{i+1}] Source: {src}\n{snippet}\n"
-        ln = len(add)
-        if total + ln > max_chars:
-            remaining = max_chars - total
-            if remaining <= 40:
+        # overlapping chunks repeat each other; skip passages whose opening words
+        # are mostly already in the context
+        sig = frozenset(snippet[:400].lower().split())
+        if _near_duplicate(sig, seen):
+            continue
+        seen.append(sig)
+        n = len(pieces) + 1
+        add = f"[{n}] Source: {src}\n{snippet}\n"
+        ln = size(add)
+        if total + ln > budget:
+            remaining = budget - total
+            if remaining <= min_piece:
                 break
-            add = add[:remaining]
+            add = clip(add, remaining)
             pieces.append(add)
-            total += len(add)
-            sources.append({"index": i+1, "source": src, "excerpt": snippet[:200]})
+            total += remaining
+            sources.append({"index": n, "source": src, "excerpt": snippet[:200]})
             break
         pieces.append(add)
         total += ln
-        sources.append({"index": i+1, "source": src, "excerpt": snippet[:200]})
+        sources.append({"index": n, "source": src, "excerpt": snippet[:200]})
     context_text = "\n\n".join(pieces)
     header = f"Top {len(pieces)} retrieved passages for: {query}\n\n"
     return header + context_text, sources
@@ -242,40 +373,87 @@ SYSTEM_PROMPT_SUGGESTIONS = """You are a helpful assistant anticipating the user
 4) Do NOT repeat the user's question.
 """
 
+def _compact_prompt(s: str) -> str:
+    # Strip indentation, blank lines and repeated spaces once at import; line breaks
+    # stay because the quiz prompt's answer template depends on them.
+    lines = (" ".join(line.split()) for line in s.splitlines())
+    return "\n".join(line for line in lines if line)
+
+SYSTEM_PROMPT_NORMAL = _compact_prompt(SYSTEM_PROMPT_NORMAL)
+SYSTEM_PROMPT_SUMMARY = _compact_prompt(SYSTEM_PROMPT_SUMMARY)
+SYSTEM_PROMPT_QUIZ = _compact_prompt(SYSTEM_PROMPT_QUIZ)
+SYSTEM_PROMPT_ELI5 = _compact_prompt(SYSTEM_PROMPT_ELI5)
+SYSTEM_PROMPT_DRAFTING = _compact_prompt(SYSTEM_PROMPT_DRAFTING)
+SYSTEM_PROMPT_SUGGESTIONS = _compact_prompt(SYSTEM_PROMPT_SUGGESTIONS)
+
 # --------------------
 # LLM call (supports old and new openai SDK)
 # --------------------
-def call_openai_chat_short(query: str, context_block: str, max_tokens: int = 512, use_context: bool = True, system_prompt_override: str = None) -> str:
-    """
-    Call OpenAI to get a concise answer.
-    - use_context=True -> include context_block in system message.
-    - use_context=False -> call model zero-shot (no local doc context) with an adjusted system prompt.
-    """
-    if _openai_pkg is None:
-        raise RuntimeError("openai package not installed")
+_BATCH_ANSWER_RE = re.compile(r"^###\s*A(\d+):", re.M)
 
+def _build_messages(query: str, context_block: str, use_context: bool = True, system_prompt_override: str = None) -> List[Dict[str, str]]:
     if use_context and context_block:
         sys_p = system_prompt_override if system_prompt_override else SYSTEM_PROMPT_NORMAL
-        messages = [
+        return [
             {"role": "system", "content": sys_p},
             {"role": "system", "content": "Context (local documents):\n" + context_block},
             {"role": "user", "content": f"Question: {query}\n\n(Follow the system instructions strictly)."}
         ]
+    # Fallback for no context OR specific zero-shot tasks (like suggestions)
+    if system_prompt_override:
+        zs_prompt = system_prompt_override
     else:
-        # Fallback for no context OR specific zero-shot tasks (like suggestions)
-        if system_prompt_override:
-            zs_prompt = system_prompt_override
-        else:
-            zs_prompt = (
-                "You are a concise, accurate legal assistant for Indian law. The user asked a question but no local documents "
-                "are available or they seemed irrelevant. Provide a short, cautious answer (1-3 sentences) from general legal knowledge. "
-                "Avoid inventing statutory numbers or cases; if uncertain, say 'I could not verify this from local documents; please verify.'"
-            )
-        messages = [
-            {"role": "system", "content": zs_prompt},
-            {"role": "user", "content": f"Question: {query}\n\nPlease answer concisely."}
-        ]
+        zs_prompt = (
+            "You are a concise, accurate legal assistant for Indian law. The user asked a question but no local documents "
+            "are available or they seemed irrelevant. Provide a short, cautious answer (1-3 sentences) from general legal knowledge. "
+            "Avoid inventing statutory numbers or cases; if uncertain, say 'I could not verify this from local documents; please verify.'"
+        )
+    return [
+        {"role": "system", "content": zs_prompt},
+        {"role": "user", "content": f"Question: {query}\n\nPlease answer concisely."}
+    ]
+
 
+def _new_client():
+    """Instantiate an openai>=1.0 client, or None if the installed package has none."""
+    client = None
+    kwargs = {"timeout": 30.0, "max_retries": 2}
+    if OpenAIClient is not None:
+        try:
+            client = OpenAIClient(api_key=OPENAI_API_KEY, **kwargs) if OPENAI_API_KEY else OpenAIClient(**kwargs)
+        except Exception:
+            try:
+                client = OpenAIClient()
+            except Exception:
+                client = None
+
+    if client is None and hasattr(_openai_pkg, "OpenAI"):
+        try:
+            client = _openai_pkg.OpenAI(api_key=OPENAI_API_KEY, **kwargs) if OPENAI_API_KEY else _openai_pkg.OpenAI(**kwargs)
+        except Exception:
+            try:
+                client = _openai_pkg.OpenAI()
+            except Exception:
+                client = None
+    return client
+
+
+# One client per process: it owns the httpx connection pool, so reusing it keeps
+# TCP/TLS connections to the API warm across questions.
+_OPENAI_CLIENT = None
+_OPENAI_CLIENT_LOCK = threading.Lock()
+
+def _get_client():
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        with _OPENAI_CLIENT_LOCK:
+            if _OPENAI_CLIENT is None:
+                _OPENAI_CLIENT = _new_client()
+    return _OPENAI_CLIENT
+
+
+def _chat_completion(messages: List[Dict[str, str]], max_tokens: int) -> str:
+    """One non-streaming chat completion (old or new SDK); returns the reply text."""
     # Try old-style ChatCompletion if available
     try:
         if hasattr(_openai_pkg, "ChatCompletion"):
@@ -296,25 +474,7 @@ def call_openai_chat_short(query: str, context_block: str, max_tokens: int = 512
 
     # Try new OpenAI client path (openai>=1.0)
     try:
-        client = None
-        if OpenAIClient is not None:
-            try:
-                client = OpenAIClient(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else OpenAIClient()
-            except Exception:
-                try:
-                    client = OpenAIClient()
-                except Exception:
-                    client = None
-
-        if client is None and hasattr(_openai_pkg, "OpenAI"):
-            try:
-                client = _openai_pkg.OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else _openai_pkg.OpenAI()
-            except Exception:
-                try:
-                    client = _openai_pkg.OpenAI()
-                except Exception:
-                    client = None
-
+        client = _get_client()
         if client is None:
             raise RuntimeError("OpenAI client unavailable in installed openai package")
 
@@ -342,9 +502,97 @@ def call_openai_chat_short(query: str, context_block: str, max_tokens: int = 512
              return "Error: Invalid OpenAI API Key. Please check the .env file."
         raise
 
+
+def call_openai_chat_short(query: str, context_block: str, max_tokens: int = 512, use_context: bool = True, system_prompt_override: str = None) -> str:
+    """
+    Call OpenAI to get a concise answer.
+    - use_context=True -> include context_block in system message.
+    - use_context=False -> call model zero-shot (no local doc context) with an adjusted system prompt.
+    """
+    if _openai_pkg is None:
+        raise RuntimeError("openai package not installed")
+
+    messages = _build_messages(query, context_block, use_context, system_prompt_override)
+    return _chat_completion(messages, max_tokens)
+
+
+def call_openai_chat_batch(queries: List[str], context_blocks: List[str], max_tokens: int = 2048, system_prompt_override: str = None) -> List[str]:
+    """
+    Answer several questions with ONE chat completion.
+    Identical context blocks are sent once and referenced by label; the reply is
+    split on '### A<i>:' markers. Returns one reply per query ("" if the model
+    skipped one).
+    """
+    if _openai_pkg is None:
+        raise RuntimeError("openai package not installed")
+
+    ctx_labels: Dict[str, str] = {}
+    ctx_parts = []
+    q_parts = []
+    for i, (q, ctx) in enumerate(zip(queries, context_blocks), start=1):
+        if ctx:
+            if ctx not in ctx_labels:
+                ctx_labels[ctx] = f"C{len(ctx_labels) + 1}"
+                ctx_parts.append(f"[{ctx_labels[ctx]}]\n{ctx}")
+            ref = f"(use context [{ctx_labels[ctx]}])"
+        else:
+            ref = "(no relevant local context; answer cautiously from general legal knowledge)"
+        q_parts.append(f"Q{i}: {q} {ref}")
+
+    messages = [{"role": "system", "content": system_prompt_override or SYSTEM_PROMPT_NORMAL}]
+    if ctx_parts:
+        messages.append({"role": "system", "content": "Context (local documents):\n" + "\n\n".join(ctx_parts)})
+    messages.append({"role": "user", "content": (
+        "Answer each question below separately, following the system instructions for each answer.\n"
+        "Format: start the answer to question i with a line '### A<i>:' (e.g. '### A1:') and output nothing else.\n\n"
+        + "\n".join(q_parts)
+    )})
+
+    reply = _chat_completion(messages, max_tokens)
+    answers = [""] * len(queries)
+    parts = _BATCH_ANSWER_RE.split(reply)
+    # parts = [preamble, n1, text1, n2, text2, ...]
+    for n, text in zip(parts[1::2], parts[2::2]):
+        i = int(n) - 1
+        if 0 <= i < len(answers):
+            answers[i] = text.strip()
+    return answers
+
+
+def call_openai_chat_stream(query: str, context_block: str, max_tokens: int = 512, use_context: bool = True, system_prompt_override: str = None) -> Iterator[str]:
+    """
+    Streaming variant of call_openai_chat_short: yields text deltas as they arrive.
+    Needs the openai>=1.0 client; with the legacy SDK the full reply is yielded at once.
+    """
+    if _openai_pkg is None:
+        raise RuntimeError("openai package not installed")
+
+    client = _get_client()
+    if client is None:
+        yield call_openai_chat_short(query, context_block, max_tokens, use_context, system_prompt_override)
+        return
+
+    messages = _build_messages(query, context_block, use_context, system_prompt_override)
+    resp = client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=max_tokens,
+        top_p=1.0,
+        stream=True
+    )
+    for chunk in resp:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
 # --------------------
 # Local fallback summarizer (concise)
 # --------------------
+_WORD_RE = re.compile(r"\w+")
+
 def _local_concise_summary(retrieved: List[Dict[str, Any]], query: str, max_sentences: int = 4) -> str:
     if not retrieved:
         return "No documents found in the index. Please upload documents to data/docs/ and build the index."
@@ -352,21 +600,21 @@ def _local_concise_summary(retrieved: List[Dict[str, Any]], query: str, max_sent
     candidates = []
     for r in retrieved[:TOP_K]:
         text = (r.get("text") or "").strip()
+        lower = r["text_lower"].strip() if "text_lower" in r else text.lower()
         src = r.get("source") or "unknown"
         parts = [p.strip() for p in text.replace("\n", " ").split(". ") if p.strip()]
-        for p in parts[:3]:
+        # lowercasing never adds or removes ". ", so the two splits line up
+        lower_parts = [p.strip() for p in lower.replace("\n", " ").split(". ") if p.strip()]
+        for p, lp in zip(parts[:3], lower_parts):
             sent = (p + ".") if not p.endswith(".") else p
-            candidates.append((sent.strip(), src))
+            candidates.append((sent.strip(), src, lp))
 
-    query_terms = [t.lower() for t in query.split() if len(t) > 3]
+    # one set intersection per sentence instead of a substring scan per query term
+    q_set = {t for t in _WORD_RE.findall(query.lower()) if len(t) > 3}
     scored = []
-    for sent, src in candidates:
-        score = 0
-        sl = sent.lower()
-        for qt in query_terms:
-            if qt in sl:
-                score += 2
-        score += min(2, len(sent.split()) / 20)
+    for sent, src, lower_sent in candidates:
+        words = _WORD_RE.findall(lower_sent)
+        score = 2 * len(q_set.intersection(words)) + min(2, len(words) / 20)
         scored.append((score, sent, src))
 
     scored.sort(key=lambda x: x[0], reverse=True)
@@ -402,8 +650,8 @@ def test_openai_conn() -> (bool, str):
     if not OPENAI_API_KEY:
         return False, "OPENAI_API_KEY not set in environment"
     try:
-        if OpenAIClient is not None:
-            client = OpenAIClient(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else OpenAIClient()
+        client = _get_client()
+        if client is not None:
             resp = client.chat.completions.create(model=OPENAI_MODEL, messages=[{"role":"user","content":"Ping"}], max_tokens=10)
             return True, "OK (new client)"
         if hasattr(_openai_pkg, "ChatCompletion"):
@@ -414,39 +662,69 @@ def test_openai_conn() -> (bool, str):
         return False, f"OpenAI call failed: {e}"
 
 # --------------------
-# Public API
+# Answer cache
 # --------------------
+_QUERY_CACHE = QueryCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL, sim_threshold=SEMANTIC_CACHE_THRESHOLD)
+
+def _cache_lookup(q: str, mode: str, top_k: int):
+    """Returns (cached answer or None, query embedding or None for the later put)."""
+    try:
+        import rag.retriever as retriever_mod
+        # version stamped when the (cached) index was loaded; no filesystem walk here
+        _QUERY_CACHE.check_version(getattr(retriever_mod.get_or_create_index(), "corpus_version", None))
+    except Exception:
+        logger.debug("corpus version check failed", exc_info=True)
+    emb = None
+    try:
+        import rag.retriever as retriever_mod
+        emb = retriever_mod.embed_query(q)
+    except Exception:
+        logger.debug("query embedding for semantic cache failed", exc_info=True)
+    return _QUERY_CACHE.get(q, mode, top_k, emb), emb
+
+def is_cacheable_answer(result: Dict[str, Any]) -> bool:
+    """False for failure replies (bad key, empty response) that must never be cached."""
+    content = result.get("content") or ""
+    return not (content.startswith("Error") or content.startswith("No response from language model"))
+
+def _cache_put(q: str, mode: str, top_k: int, result: Dict[str, Any], q_emb) -> None:
+    """Caches a completed answer; failure replies are never stored."""
+    if is_cacheable_answer(result):
+        _QUERY_CACHE.put(q, mode, top_k, result, q_emb)
+
 # --------------------
 # Public API
 # --------------------
-def answer_query(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None, use_llm: Optional[bool] = None, mode: str = "Normal") -> str:
-    """
-    - query: user's question
-    - top_k: number of retrieval results to fetch
-    - verbose: if True, append a short sources list; default from RAG_VERBOSE env
-    - use_llm: True to force LLM (requires OPENAI_API_KEY), False to force local fallback,
-               None => default is determined by presence of OPENAI_API_KEY
-    - mode: "Normal", "Summary", or "Quiz"
-    """
-    verbose_flag = RAG_VERBOSE if verbose is None else bool(verbose)
-    use_llm_flag = bool(use_llm) if use_llm is not None else bool(OPENAI_API_KEY)
+SUGGESTIONS_DELIM = "|||SUGGESTIONS|||"
+
+def _term_hits(q: str, retrieved: List[Dict[str, Any]]) -> int:
+    """Most query-term occurrences found in any one snippet."""
+    q_terms = [t.lower() for t in q.split() if len(t) > 3] or [q.lower()]
+    best_match = 0
+    for r in retrieved:
+        txt = r["text_lower"] if "text_lower" in r else (r.get("text") or "").lower()
+        best_match = max(best_match, sum(txt.count(term) for term in q_terms))
+    return best_match
 
-    q = (query or "").strip()
-    if not q:
-        return "Please ask a question."
 
+def _prepare_answer(q: str, top_k: int, mode: str):
+    """
+    Shared front half of answer_query / answer_query_stream: retrieval, relevance
+    heuristic, context block and system prompt selection.
+    """
     retriever = _try_get_retriever_functions()
     retrieved = []
     if retriever:
         try:
             raw = retriever(q, top_k)
             retrieved = _normalize_retriever_result(raw)
-            # DEBUG: log top retrieved results (short)
-            try:
-                debug_list = [{"source": r.get("source"), "snippet": (r.get("text") or "")[:220]} for r in retrieved[:min(len(retrieved), 6)]]
-                logger.info("RAG debug — top retrieved: %s", pp.pformat(debug_list))
-            except Exception:
-                logger.exception("Failed to log retrieved debug info")
+            # DEBUG: log top retrieved results (short); pformat only when it will be emitted
+            if logger.isEnabledFor(logging.DEBUG):
+                try:
+                    debug_list = [{"source": r.get("source"), "snippet": (r.get("text") or "")[:220]} for r in retrieved[:min(len(retrieved), 6)]]
+                    logger.debug("RAG debug — top retrieved: %s", pp.pformat(debug_list))
+                except Exception:
+                    logger.exception("Failed to log retrieved debug info")
         except Exception:
             logger.exception("Retriever error")
             retrieved = []
@@ -454,26 +732,17 @@ def answer_query(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None,
         logger.info("No retriever configured; proceeding without local context.")
         retrieved = []
 
-    # Quick relevance heuristic: count query-term hits in each snippet
-    use_context = True
-    try:
-        q_terms = [t.lower() for t in q.split() if len(t) > 3]
-        if not q_terms:
-            q_terms = [q.lower()]
-
-        best_match = 0
-        for r in retrieved[:top_k]:
-            txt = (r.get("text") or "").lower()
-            count = sum(txt.count(term) for term in q_terms)
-            if count > best_match:
-                best_match = count
-
-        logger.info("RAG debug — best_match_term_count=%s for query='%s'", best_match, q)
-        # If best_match is too low (e.g., <2), treat retrieved docs as irrelevant
-        if best_match < 2:
-            use_context = False
-    except Exception:
-        use_context = True
+    # Relevance: the retriever's own scores decide; if nothing clears
+    # RAG_MIN_SCORE the docs are treated as irrelevant (zero-shot path)
+    top = retrieved[:top_k]
+    if top and all(r.get("score") is None for r in top):
+        # retriever reports no scores: fall back to counting query-term hits
+        use_context = _term_hits(q, top) >= 2
+        logger.debug("RAG debug — unscored results, term-hit heuristic use_context=%s for query='%s'", use_context, q)
+    else:
+        relevant = _above_cutoff(top)
+        use_context = bool(relevant)
+        logger.debug("RAG debug — %d/%d results above score %.2f for query='%s'", len(relevant), len(top), RAG_MIN_SCORE, q)
 
     context_block = ""
     sources_meta = []
@@ -482,64 +751,61 @@ def answer_query(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None,
     else:
         context_block = ""  # ensure no local context will be used
 
+    return retrieved, use_context, context_block, sources_meta, _system_prompt_for(mode)
+
+
+def _system_prompt_for(mode: str) -> str:
     # Select system prompt based on mode
     if mode == "Summary":
-        sys_p = SYSTEM_PROMPT_SUMMARY
+        return SYSTEM_PROMPT_SUMMARY
     elif mode == "Quiz":
-        sys_p = SYSTEM_PROMPT_QUIZ
+        return SYSTEM_PROMPT_QUIZ
     elif mode == "ELI5":
-        sys_p = SYSTEM_PROMPT_ELI5
+        return SYSTEM_PROMPT_ELI5
     elif mode == "Drafting":
-        sys_p = SYSTEM_PROMPT_DRAFTING
-    else:
-        sys_p = SYSTEM_PROMPT_NORMAL
+        return SYSTEM_PROMPT_DRAFTING
+    return SYSTEM_PROMPT_NORMAL
 
-    # If LLM path requested and available
-    if use_llm_flag and OPENAI_API_KEY and _openai_pkg is not None:
-        try:
-            # OPTIMIZATION: Combine Answer + Suggestions in one call to reduce latency
-            # We append a special instruction to the system prompt or query
-            if mode in ["Normal", "ELI5", "Summary"]:
-                combo_instruction = (
-                    "\n\nIMPORTANT: After providing the answer, output the delimiter '|||SUGGESTIONS|||' "
-                    "followed immediately by 3 specific, legally relevant follow-up questions separated by pipes (|). "
-                    "Example: Answer text... |||SUGGESTIONS|||Question 1?|Question 2?|Question 3?"
-                )
-                # Temporarily modify the system prompt or just rely on the instruction being strong enough
-                # We'll append it to the query to ensure it's seen last
-                q_for_llm = f"{q}\n{combo_instruction}"
-            else:
-                q_for_llm = q
-
-            reply_text = call_openai_chat_short(q_for_llm, context_block, max_tokens=1024, use_context=use_context, system_prompt_override=sys_p)
-            
-            suggestions = []
-            final_content = reply_text
-
-            if "|||SUGGESTIONS|||" in reply_text:
-                parts = reply_text.split("|||SUGGESTIONS|||")
-                final_content = parts[0].strip()
-                if len(parts) > 1:
-                    s_raw = parts[1].strip()
-                    suggestions = [s.strip() for s in s_raw.split('|') if "?" in s][:3]
-            
-            # Post-processing for specific modes
-            if mode == "Normal" and not suggestions: 
-                 # Fallback trim for normal if suggestions weren't generated correctly (rare)
-                 final_content = final_content.strip().split("\n\n")[0].strip()
-
-            return {
-                "content": final_content,
-                "suggestions": suggestions,
-                "sources": sources_meta
-            }
 
-        except Exception:
-            logger.exception("OpenAI synth failed — falling back to local summary.")
+def _query_for_llm(q: str, mode: str) -> str:
+    # OPTIMIZATION: Combine Answer + Suggestions in one call to reduce latency
+    # We append a special instruction to the system prompt or query
+    if mode in ["Normal", "ELI5", "Summary"]:
+        combo_instruction = (
+            f"\n\nIMPORTANT: After providing the answer, output the delimiter '{SUGGESTIONS_DELIM}' "
+            "followed immediately by 3 specific, legally relevant follow-up questions separated by pipes (|). "
+            f"Example: Answer text... {SUGGESTIONS_DELIM}Question 1?|Question 2?|Question 3?"
+        )
+        # Temporarily modify the system prompt or just rely on the instruction being strong enough
+        # We'll append it to the query to ensure it's seen last
+        return f"{q}\n{combo_instruction}"
+    return q
 
-    if use_llm_flag and not OPENAI_API_KEY:
-        logger.warning("LLM was requested (use_llm=True) but OPENAI_API_KEY not set — using local fallback.")
 
+def _finalize_llm_reply(reply_text: str, mode: str, sources_meta: List[Dict[str, Any]]) -> Dict[str, Any]:
+    suggestions = []
+    final_content = reply_text
+
+    if SUGGESTIONS_DELIM in reply_text:
+        parts = reply_text.split(SUGGESTIONS_DELIM)
+        final_content = parts[0].strip()
+        if len(parts) > 1:
+            s_raw = parts[1].strip()
+            suggestions = [s.strip() for s in s_raw.split('|') if "?" in s][:3]
+    
+    # Post-processing for specific modes
+    if mode == "Normal" and not suggestions: 
+         # Fallback trim for normal if suggestions weren't generated correctly (rare)
+         final_content = final_content.strip().split("\n\n")[0].strip()
+
+    return {
+        "content": final_content,
+        "suggestions": suggestions,
+        "sources": sources_meta
+    }
+
+
+def _local_answer(retrieved: List[Dict[str, Any]], q: str, top_k: int, verbose_flag: bool, sources_meta: List[Dict[str, Any]]) -> Dict[str, Any]:
     # Fallback: local concise summary
     concise = _local_concise_summary(retrieved, q, max_sentences=4)
     if verbose_flag and retrieved:
@@ -555,3 +821,255 @@ def answer_query(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None,
         "suggestions": [],
         "sources": sources_meta
     }
+
+
+def answer_query(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None, use_llm: Optional[bool] = None, mode: str = "Normal", stream: bool = False) -> str:
+    """
+    - query: user's question
+    - top_k: number of retrieval results to fetch
+    - verbose: if True, append a short sources list; default from RAG_VERBOSE env
+    - use_llm: True to force LLM (requires OPENAI_API_KEY), False to force local fallback,
+               None => default is determined by presence of OPENAI_API_KEY
+    - mode: "Normal", "Summary", or "Quiz"
+    - stream: if True, return the answer_query_stream generator instead (yields
+              text deltas, returns the answer dict)
+    """
+    if stream:
+        return answer_query_stream(query, top_k=top_k, verbose=verbose, use_llm=use_llm, mode=mode)
+
+    verbose_flag = RAG_VERBOSE if verbose is None else bool(verbose)
+    use_llm_flag = bool(use_llm) if use_llm is not None else bool(OPENAI_API_KEY)
+
+    q = (query or "").strip()
+    if not q:
+        return "Please ask a question."
+
+    llm_ready = use_llm_flag and OPENAI_API_KEY and _openai_pkg is not None
+    if llm_ready:
+        cached, q_emb = _cache_lookup(q, mode, top_k)
+        if cached is not None:
+            return cached
+
+    retrieved, use_context, context_block, sources_meta, sys_p = _prepare_answer(q, top_k, mode)
+
+    # If LLM path requested and available
+    if llm_ready:
+        try:
+            reply_text = call_openai_chat_short(_query_for_llm(q, mode), context_block, max_tokens=1024, use_context=use_context, system_prompt_override=sys_p)
+            result = _finalize_llm_reply(reply_text, mode, sources_meta)
+            _cache_put(q, mode, top_k, result, q_emb)
+            return result
+        except Exception:
+            logger.exception("OpenAI synth failed — falling back to local summary.")
+
+    if use_llm_flag and not OPENAI_API_KEY:
+        logger.warning("LLM was requested (use_llm=True) but OPENAI_API_KEY not set — using local fallback.")
+
+    return _local_answer(retrieved, q, top_k, verbose_flag, sources_meta)
+
+
+def answer_query_stream(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None, use_llm: Optional[bool] = None, mode: str = "Normal") -> Generator[str, None, Dict[str, Any]]:
+    """
+    Streaming variant of answer_query.
+    Yields answer text deltas as the model produces them (the suggestions tail is
+    never yielded) and returns the same dict answer_query would, available as
+    StopIteration.value / the value of `yield from`. The dict has "complete": True
+    only for a full, cacheable LLM answer (not an interrupted stream, a failure
+    reply or the local-summary fallback), so callers know what they may cache.
+    """
+    verbose_flag = RAG_VERBOSE if verbose is None else bool(verbose)
+    use_llm_flag = bool(use_llm) if use_llm is not None else bool(OPENAI_API_KEY)
+
+    q = (query or "").strip()
+    if not q:
+        yield "Please ask a question."
+        return {"content": "Please ask a question.", "suggestions": [], "sources": []}
+
+    llm_ready = use_llm_flag and OPENAI_API_KEY and _openai_pkg is not None
+    if llm_ready:
+        cached, q_emb = _cache_lookup(q, mode, top_k)
+        if cached is not None:
+            cached["complete"] = True  # only cacheable answers get into _QUERY_CACHE
+            yield cached["content"]
+            return cached
+
+    retrieved, use_context, context_block, sources_meta, sys_p = _prepare_answer(q, top_k, mode)
+
+    if llm_ready:
+        raw = []
+        pending = ""       # text not yet yielded (may hold a partial delimiter)
+        in_suggestions = False
+        try:
+            for delta in call_openai_chat_stream(_query_for_llm(q, mode), context_block, max_tokens=1024, use_context=use_context, system_prompt_override=sys_p):
+                raw.append(delta)
+                if in_suggestions:
+                    continue
+                pending += delta
+                if SUGGESTIONS_DELIM in pending:
+                    head = pending.split(SUGGESTIONS_DELIM, 1)[0]
+                    if head:
+                        yield head
+                    pending = ""
+                    in_suggestions = True
+                    continue
+                # hold back just enough tail to recognise a delimiter split across chunks
+                keep = len(SUGGESTIONS_DELIM) - 1
+                if len(pending) > keep:
+                    yield pending[:-keep]
+                    pending = pending[-keep:]
+            if pending:
+                yield pending
+            result = _finalize_llm_reply("".join(raw).strip(), mode, sources_meta)
+            result["complete"] = is_cacheable_answer(result)
+            _cache_put(q, mode, top_k, result, q_emb)  # partial (interrupted) replies are not cached
+            return result
+        except Exception:
+            if raw:
+                logger.exception("OpenAI stream interrupted — keeping partial answer.")
+                return _finalize_llm_reply("".join(raw).strip(), mode, sources_meta)
+            logger.exception("OpenAI synth failed — falling back to local summary.")
+
+    if use_llm_flag and not OPENAI_API_KEY:
+        logger.warning("LLM was requested (use_llm=True) but OPENAI_API_KEY not set — using local fallback.")
+
+    result = _local_answer(retrieved, q, top_k, verbose_flag, sources_meta)
+    yield result["content"]
+    return result
+
+
+def answer_queries(queries: List[str], top_k: int = TOP_K, verbose: Optional[bool] = None, use_llm: Optional[bool] = None, mode: str = "Normal", batch_size: int = BATCH_ANSWER_SIZE) -> List[Dict[str, Any]]:
+    """
+    Bulk variant of answer_query (evaluation, bulk classification): retrieval runs
+    per query, but up to batch_size questions share one LLM call, so the system
+    prompt and any shared context are sent once per batch. No follow-up
+    suggestions are generated. Returns one answer dict per query, in order.
+    """
+    verbose_flag = RAG_VERBOSE if verbose is None else bool(verbose)
+    use_llm_flag = bool(use_llm) if use_llm is not None else bool(OPENAI_API_KEY)
+    llm_ready = use_llm_flag and OPENAI_API_KEY and _openai_pkg is not None
+
+    # Packed answers (split from one reply, no suggestions) live in their own cache
+    # namespace so interactive answer_query never gets one back
+    cache_ns = f"{mode}|batch"
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    pending = []  # (i, q, q_emb, prepared)
+    for i, query in enumerate(queries):
+        q = (query or "").strip()
+        if not q:
+            results[i] = {"content": "Please ask a question.", "suggestions": [], "sources": []}
+            continue
+        q_emb = None
+        if llm_ready:
+            cached, q_emb = _cache_lookup(q, cache_ns, top_k)
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append((i, q, q_emb, _prepare_answer(q, top_k, mode)))
+
+    if llm_ready:
+        sys_p = _system_prompt_for(mode)
+        for start in range(0, len(pending), max(1, batch_size)):
+            batch = pending[start:start + batch_size]
+            try:
+                replies = call_openai_chat_batch(
+                    [q for _, q, _, _ in batch],
+                    [prep[2] if prep[1] else "" for _, _, _, prep in batch],
+                    max_tokens=min(4096, 512 * len(batch)),
+                    system_prompt_override=sys_p
+                )
+            except Exception:
+                logger.exception("OpenAI batch synth failed — falling back to local summaries.")
+                continue
+            for (i, q, q_emb, prep), reply in zip(batch, replies):
+                if reply:
+                    results[i] = _finalize_llm_reply(reply, mode, prep[3])
+                    _cache_put(q, cache_ns, top_k, results[i], q_emb)
+
+    for i, q, _, (retrieved, _, _, sources_meta, _) in pending:
+        if results[i] is None:
+            results[i] = _local_answer(retrieved, q, top_k, verbose_flag, sources_meta)
+    return results
+
+
+# --------------------
+# Async API (bulk / concurrent callers)
+# --------------------
+def _new_async_client():
+    """AsyncOpenAI client, or None (legacy SDK). Bound to the running event loop, so make one per asyncio.run."""
+    try:
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else AsyncOpenAI()
+    except Exception:
+        return None
+
+
+async def call_openai_chat_async(client, query: str, context_block: str, max_tokens: int = 512, use_context: bool = True, system_prompt_override: str = None) -> str:
+    """Non-blocking call_openai_chat_short; runs the sync call in a thread when no async client is available."""
+    if client is None:
+        return await asyncio.to_thread(call_openai_chat_short, query, context_block, max_tokens, use_context, system_prompt_override)
+    resp = await client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=_build_messages(query, context_block, use_context, system_prompt_override),
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=max_tokens,
+        top_p=1.0
+    )
+    if not resp.choices:
+        return "No response from language model."
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def answer_query_async(query: str, top_k: int = TOP_K, verbose: Optional[bool] = None, use_llm: Optional[bool] = None, mode: str = "Normal", client=None) -> Dict[str, Any]:
+    """
+    Async variant of answer_query. The cache lookup (query embedding) and the
+    retrieval are blocking, so they run in worker threads (retrieval only on a
+    cache miss); the LLM call awaits the AsyncOpenAI client instead of blocking
+    the loop. Without a client one is created for this call and closed after it;
+    answer_queries_async shares one across all its queries.
+    """
+    verbose_flag = RAG_VERBOSE if verbose is None else bool(verbose)
+    use_llm_flag = bool(use_llm) if use_llm is not None else bool(OPENAI_API_KEY)
+
+    q = (query or "").strip()
+    if not q:
+        return {"content": "Please ask a question.", "suggestions": [], "sources": []}
+
+    llm_ready = use_llm_flag and OPENAI_API_KEY and _openai_pkg is not None
+    if llm_ready:
+        cached, q_emb = await asyncio.to_thread(_cache_lookup, q, mode, top_k)
+        if cached is not None:
+            return cached
+    retrieved, use_context, context_block, sources_meta, sys_p = await asyncio.to_thread(_prepare_answer, q, top_k, mode)
+
+    if llm_ready:
+        own_client = client is None
+        if own_client:
+            client = _new_async_client()
+        try:
+            reply_text = await call_openai_chat_async(client, _query_for_llm(q, mode), context_block, max_tokens=1024, use_context=use_context, system_prompt_override=sys_p)
+            result = _finalize_llm_reply(reply_text, mode, sources_meta)
+            _cache_put(q, mode, top_k, result, q_emb)
+            return result
+        except Exception:
+            logger.exception("OpenAI synth failed — falling back to local summary.")
+        finally:
+            if own_client and client is not None:
+                await client.close()
+
+    return _local_answer(retrieved, q, top_k, verbose_flag, sources_meta)
+
+
+async def answer_queries_async(queries: List[str], max_concurrency: int = 4, **kwargs) -> List[Dict[str, Any]]:
+    """answer_query_async over many queries, at most max_concurrency in flight. Results keep input order."""
+    client = _new_async_client()
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def one(q):
+        async with sem:
+            return await answer_query_async(q, client=client, **kwargs)
+
+    try:
+        return await asyncio.gather(*(one(q) for q in queries))
+    finally:
+        if client is not None:
+            await client.close()
@@ -0,0 +1,129 @@
+# rag/batch_runner.py
+# Offline bulk answering through the OpenAI Batch API.
+# Requests are written to a JSONL file, uploaded, and processed within the batch
+# completion window at roughly half the per-token price and outside the
+# synchronous rate limits. Only for non-interactive jobs (suggestion datasets,
+# re-scoring query sets) — the app keeps using answer_query_stream.
+#
+# Usage: python -m rag.batch_runner queries.txt [mode]   (one question per line)
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from rag.answer import (
+    OPENAI_MODEL, OPENAI_TEMPERATURE, TOP_K,
+    _build_messages, _finalize_llm_reply, _get_client, _prepare_answer, _query_for_llm,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = "data/batches"
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "30"))
+
+
+def build_batch_requests(queries: List[str], top_k: int = TOP_K, mode: str = "Normal", max_tokens: int = 1024) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    One Batch API request per distinct question, carrying exactly the messages
+    answer_query would send. Returns (requests, meta) with meta keyed by custom_id.
+    """
+    requests, meta = [], {}
+    for query in queries:
+        q = (query or "").strip()
+        if not q:
+            continue
+        custom_id = hashlib.sha1(q.encode("utf-8")).hexdigest()
+        if custom_id in meta:
+            continue
+        _, use_context, context_block, sources_meta, sys_p = _prepare_answer(q, top_k, mode)
+        requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": OPENAI_MODEL,
+                "messages": _build_messages(_query_for_llm(q, mode), context_block, use_context, sys_p),
+                "temperature": OPENAI_TEMPERATURE,
+                "max_tokens": max_tokens,
+                "top_p": 1.0,
+            },
+        })
+        meta[custom_id] = {"query": q, "sources": sources_meta}
+    return requests, meta
+
+
+def submit_batch(client, requests: List[Dict[str, Any]]) -> str:
+    """Writes the requests to JSONL, uploads them and starts the batch; returns its id."""
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    path = os.path.join(BATCH_DIR, f"batch-{int(time.time())}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for r in requests:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, "rb") as f:
+        upload = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=upload.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+    logger.info("Submitted batch %s (%d requests, input %s)", batch.id, len(requests), path)
+    return batch.id
+
+
+def wait_for_batch(client, batch_id: str, poll_seconds: int = BATCH_POLL_SECONDS):
+    """Polls until the batch reaches a terminal status and returns it."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in ("completed", "failed", "expired", "cancelled"):
+            return batch
+        logger.info("Batch %s: %s", batch_id, batch.status)
+        time.sleep(poll_seconds)
+
+
+def collect_batch_results(client, batch) -> Dict[str, str]:
+    """Maps custom_id -> reply text for every request that succeeded."""
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+    out = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        body = (row.get("response") or {}).get("body") or {}
+        choices = body.get("choices") or []
+        if row.get("error") or not choices:
+            logger.warning("Batch request %s failed: %s", row.get("custom_id"), row.get("error"))
+            continue
+        out[row["custom_id"]] = (choices[0]["message"]["content"] or "").strip()
+    return out
+
+
+def answer_query_batch_async(queries: List[str], top_k: int = TOP_K, mode: str = "Normal") -> Dict[str, Dict[str, Any]]:
+    """
+    Answers queries through the Batch API (blocks until the batch finishes —
+    minutes to hours). Returns {query: answer dict as answer_query returns it};
+    queries whose request failed are missing from the result.
+    """
+    client = _get_client()
+    if client is None:
+        raise RuntimeError("Batch API needs the openai>=1.0 client")
+    requests, meta = build_batch_requests(queries, top_k, mode)
+    if not requests:
+        return {}
+    batch = wait_for_batch(client, submit_batch(client, requests))
+    replies = collect_batch_results(client, batch)
+    return {
+        meta[cid]["query"]: _finalize_llm_reply(text, mode, meta[cid]["sources"])
+        for cid, text in replies.items() if cid in meta
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m rag.batch_runner queries.txt [mode]")
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        qs = [line.strip() for line in f if line.strip()]
+    results = answer_query_batch_async(qs, mode=sys.argv[2] if len(sys.argv) > 2 else "Normal")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -1,17 +1,38 @@
 # rag/loader.py
 # Loads PDF/TXT files from data/docs, cleans, and chunks them.
 
-from typing import List, Dict
-import os, re
-from pypdf import PdfReader
+from typing import List, Dict, Iterator, Optional, Tuple
+import os, json, hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 DOCS_DIR = "data/docs"
+# Extracted PDF text, reused while the PDF's (mtime, size) is unchanged
+PDF_CACHE_DIR = "data/.cache/pdf"
+# Per-document chunk texts from the last build_chunks, keyed by path + (mtime, size)
+CHUNK_CACHE_FILE = "data/.cache/chunks.json"
 
 def read_txt(fp: str) -> str:
     with open(fp, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
+def _pdf_cache_paths(fp: str):
+    key = hashlib.sha1(os.path.abspath(fp).encode("utf-8")).hexdigest()
+    base = os.path.join(PDF_CACHE_DIR, key)
+    return base + ".txt", base + ".meta"
+
 def read_pdf(fp: str) -> str:
+    st = os.stat(fp)
+    stamp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    txt_path, meta_path = _pdf_cache_paths(fp)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == stamp:
+                with open(txt_path, "r", encoding="utf-8") as t:
+                    return t.read()
+    except (OSError, ValueError):
+        pass  # no usable cache entry
+
+    from pypdf import PdfReader  # only needed once PDFs are (re)indexed
     reader = PdfReader(fp)
     parts = []
     for page in reader.pages:
@@ -19,72 +40,163 @@ def read_pdf(fp: str) -> str:
             parts.append(page.extract_text() or "")
         except Exception:
             parts.append("")
-    return "\n".join(parts)
+    text = "\n".join(parts)
+
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        # meta last: a crash mid-write leaves no matching meta, so no stale hit
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(stamp, f)
+    except OSError as e:
+        print(f"[loader] Could not cache text for {fp}: {e}")
+    return text
+
+def _extract_one(fp: str, ext: str):
+    """Worker: (fp, raw text or None, error or None). Module-level so it pickles."""
+    try:
+        return fp, (read_txt(fp) if ext == ".txt" else read_pdf(fp)), None
+    except Exception as e:
+        return fp, None, e
+
+def _corpus_files() -> List[Tuple[str, str]]:
+    """(path, ext) of every indexable file under DOCS_DIR, in walk order."""
+    files = []
+    for root, _, names in os.walk(DOCS_DIR):
+        for name in names:
+            ext = os.path.splitext(name)[1].lower()
+            if ext in (".txt", ".pdf"):
+                files.append((os.path.join(root, name), ext))
+    return files
 
-def load_corpus() -> List[Dict]:
+def _fingerprint(fp: str) -> List[int]:
+    st = os.stat(fp)
+    return [st.st_mtime_ns, st.st_size]
+
+def load_corpus(files: Optional[List[Tuple[str, str]]] = None) -> List[Dict]:
     """
     Returns list of {id, source, text}
+    - files: (path, ext) pairs to load; default is everything under DOCS_DIR
     """
     os.makedirs(DOCS_DIR, exist_ok=True)
+    if files is None:
+        files = _corpus_files()
+
+    # PDF extraction is CPU-bound; spread files over processes (map keeps walk order)
+    if len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as ex:
+            extracted = list(ex.map(_extract_one, *zip(*files)))
+    else:
+        extracted = [_extract_one(fp, ext) for fp, ext in files]
+
     corpus = []
     idx = 0
-    for root, _, files in os.walk(DOCS_DIR):
-        for name in files:
-            fp = os.path.join(root, name)
-            ext = os.path.splitext(name)[1].lower()
-            try:
-                if ext == ".txt":
-                    raw = read_txt(fp)
-                elif ext == ".pdf":
-                    raw = read_pdf(fp)
-                else:
-                    continue
-                text = normalize_text(raw)
-                if text.strip():
-                    corpus.append({"id": f"doc-{idx}", "source": fp, "text": text})
-                    idx += 1
-            except Exception as e:
-                # skip unreadable files
-                print(f"[loader] Skipped {fp}: {e}")
+    for fp, raw, err in extracted:
+        if err is not None:
+            # skip unreadable files
+            print(f"[loader] Skipped {fp}: {err}")
+            continue
+        text = normalize_text(raw)
+        if text.strip():
+            corpus.append({"id": f"doc-{idx}", "source": fp, "text": text})
+            idx += 1
     return corpus
 
+def corpus_version() -> int:
+    """
+    Cheap stamp of the indexed documents (path, size, mtime) — changes whenever
+    a file in DOCS_DIR is added, removed or rewritten. Used to invalidate caches.
+    """
+    stamp = []
+    for fp, _ in _corpus_files():
+        try:
+            stamp.append((fp, *_fingerprint(fp)))
+        except OSError:
+            continue
+    return hash(tuple(sorted(stamp)))
+
 def normalize_text(s: str) -> str:
     s = s.replace("\r", "\n")
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    s = re.sub(r"[ \t]+", " ", s)
+    # collapse runs of whitespace within each line (str.split is C-fast, no regex)
+    s = "\n".join(" ".join(line.split()) for line in s.split("\n"))
+    # at most one blank line in a row; each pass shrinks a run by a third
+    while "\n\n\n" in s:
+        s = s.replace("\n\n\n", "\n\n")
     return s.strip()
 
-def chunk_text(text: str, chunk_tokens: int = 180, overlap: int = 30) -> List[str]:
+def chunk_text(text: str, chunk_tokens: int = 180, overlap: int = 30) -> Iterator[str]:
     """
     Simple whitespace 'token' chunker. Adjust sizes as needed.
+    Yields chunks lazily; the text is split into words once.
     """
     words = text.split()
-    if not words:
-        return []
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = words[i:i+chunk_tokens]
-        chunks.append(" ".join(chunk))
-        i += max(1, chunk_tokens - overlap)
-    return chunks
+    step = max(1, chunk_tokens - overlap)
+    for i in range(0, len(words), step):
+        yield " ".join(words[i:i+chunk_tokens])
+
+def _load_chunk_cache() -> Dict[str, Dict]:
+    try:
+        with open(CHUNK_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_chunk_cache(cache: Dict[str, Dict]):
+    try:
+        os.makedirs(os.path.dirname(CHUNK_CACHE_FILE), exist_ok=True)
+        tmp = CHUNK_CACHE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp, CHUNK_CACHE_FILE)
+    except OSError as e:
+        print(f"[loader] Could not save chunk cache: {e}")
 
 def build_chunks() -> List[Dict]:
     """
     Returns list of chunks:
     [{ 'chunk_id', 'doc_id', 'source', 'text' }]
+    Only documents whose (mtime, size) changed since the last build are read and
+    re-chunked; the rest reuse their cached chunk texts. Ids are assigned fresh
+    in walk order, so the result equals a full rebuild.
     """
-    items = load_corpus()
+    os.makedirs(DOCS_DIR, exist_ok=True)
+    files = _corpus_files()
+    prev = _load_chunk_cache()
+
+    fingerprints = {}
+    for fp, _ in files:
+        try:
+            fingerprints[fp] = _fingerprint(fp)
+        except OSError:
+            continue
+    stale = [(fp, ext) for fp, ext in files
+             if fp in fingerprints and (prev.get(fp) or {}).get("fp") != fingerprints[fp]]
+    fresh = {doc["source"]: list(chunk_text(doc["text"])) for doc in load_corpus(stale)} if stale else {}
+    stale_paths = {fp for fp, _ in stale}
+
+    cache = {}
     chunks = []
     c = 0
-    for doc in items:
-        parts = chunk_text(doc["text"])
+    d = 0
+    for fp, _ in files:
+        if fp in fresh:
+            parts = fresh[fp]
+        elif fp in fingerprints and fp not in stale_paths:
+            parts = prev[fp]["chunks"]
+        else:
+            continue  # unreadable or empty; retried next build
+        cache[fp] = {"fp": fingerprints[fp], "chunks": parts}
+        doc_id = f"doc-{d}"
+        d += 1
         for p in parts:
             chunks.append({
                 "chunk_id": f"chunk-{c}",
-                "doc_id": doc["id"],
-                "source": doc["source"],
+                "doc_id": doc_id,
+                "source": fp,
                 "text": p
             })
             c += 1
+
+    _save_chunk_cache(cache)
     return chunks
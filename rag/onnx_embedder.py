@@ -0,0 +1,55 @@
+# rag/onnx_embedder.py
+# ONNX Runtime stand-in for SentenceTransformer on CPU-only hosts.
+# The MiniLM backbone is exported once to ONNX_DIR (or on first load) and run
+# through onnxruntime with full graph optimizations; pooling and normalization
+# happen in NumPy, so the retriever can call .encode() exactly as it would on
+# SentenceTransformer.
+#
+# One-time export: python -m optimum.exporters.onnx --model sentence-transformers/all-MiniLM-L6-v2 data/onnx/
+
+import os
+from typing import List
+
+import numpy as np
+
+ONNX_DIR = os.getenv("RAG_ONNX_DIR", "data/onnx")
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length
+
+
+class OnnxEmbedder:
+    def __init__(self, model_name: str, onnx_dir: str = ONNX_DIR):
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        if os.path.isdir(onnx_dir) and any(f.endswith(".onnx") for f in os.listdir(onnx_dir)):
+            self.model = ORTModelForFeatureExtraction.from_pretrained(onnx_dir, session_options=opts)
+            self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        else:
+            repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            self.model = ORTModelForFeatureExtraction.from_pretrained(repo, export=True, session_options=opts)
+            self.tokenizer = AutoTokenizer.from_pretrained(repo)
+            self.model.save_pretrained(onnx_dir)
+            self.tokenizer.save_pretrained(onnx_dir)
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, **_) -> np.ndarray:
+        """Mean-pooled sentence embeddings, shape (len(texts), dim), float32."""
+        out = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=MAX_SEQ_LENGTH, return_tensors="np",
+            )
+            hidden = self.model(**enc).last_hidden_state
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32, copy=False))
+        if not out:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        return np.vstack(out)
@@ -0,0 +1,111 @@
+# rag/query_cache.py
+# Two-tier cache for RAG answers:
+# - exact tier: sha1(query|mode|top_k) -> answer
+# - semantic tier: a near-duplicate query (cosine >= threshold on the normalized
+#   query embedding, same mode/top_k) reuses the cached answer; candidates come
+#   from an LSH index (rag/semantic_cache.py), so lookups don't scan every entry.
+#   A semantic hit also needs the same numeric tokens ("302", "304b", "1860"):
+#   MiniLM puts "Section 302 IPC" and "Section 304 IPC" above the threshold, and
+#   answering for the wrong section is worse than a miss.
+# Both tiers share one TTL + LRU store; a corpus version stamp clears everything
+# when the indexed documents change.
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+from rag.semantic_cache import SemanticLSH
+
+_NUMERIC_TOKEN_RE = re.compile(r"\w*\d\w*")
+
+
+def numeric_tokens(query: str) -> frozenset:
+    """Section/article numbers, years etc. in a query; semantic hits must match them exactly."""
+    return frozenset(_NUMERIC_TOKEN_RE.findall(query.lower()))
+
+
+class QueryCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0, sim_threshold: float = 0.95, lsh_bits: int = 16):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sim_threshold = sim_threshold
+        self._lock = threading.RLock()
+        # key -> (timestamp, namespace, embedding or None, value); namespace is
+        # (mode, top_k, numeric_tokens(query))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        # semantic tier: LSH buckets over the stored embeddings
+        self._lsh = SemanticLSH(n_bits=lsh_bits)
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, mode: str, top_k: int) -> str:
+        return hashlib.sha1(f"{query}|{mode}|{top_k}".encode("utf-8")).hexdigest()
+
+    def check_version(self, version: Hashable) -> None:
+        """Drop every entry if the corpus version changed since the last call."""
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._lsh.clear()
+
+    def get(self, query: str, mode: str, top_k: int, embedding: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        key = self.make_key(query, mode, top_k)
+        now = time.time()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                if now - hit[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits["exact"] += 1
+                    return dict(hit[3])
+                self._pop(key)
+
+            if embedding is not None:
+                sem_key = self._nearest(embedding, (mode, top_k, numeric_tokens(query)), now)
+                if sem_key is not None:
+                    self._entries.move_to_end(sem_key)
+                    self.hits["semantic"] += 1
+                    return dict(self._entries[sem_key][3])
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, mode: str, top_k: int, value: Dict[str, Any], embedding: Optional[np.ndarray] = None) -> None:
+        key = self.make_key(query, mode, top_k)
+        emb = None if embedding is None else np.asarray(embedding, dtype=np.float32).ravel()
+        with self._lock:
+            self._entries[key] = (time.time(), (mode, top_k, numeric_tokens(query)), emb, dict(value))
+            self._entries.move_to_end(key)
+            if emb is not None:
+                self._lsh.add(key, emb)
+            else:
+                self._lsh.remove(key)
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                self._lsh.remove(old_key)
+
+    def _pop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._lsh.remove(key)
+
+    def _nearest(self, embedding: np.ndarray, namespace: tuple, now: float) -> Optional[str]:
+        keys = [k for k in self._lsh.candidates(embedding)
+                if self._entries[k][1] == namespace and now - self._entries[k][0] <= self.ttl]
+        if not keys:
+            return None
+        # both sides are L2-normalized so dot == cosine
+        sims = np.vstack([self._entries[k][2] for k in keys]) @ np.asarray(embedding, dtype=np.float32).ravel()
+        best = int(np.argmax(sims))
+        return keys[best] if sims[best] >= self.sim_threshold else None
@@ -1,25 +1,138 @@
 # rag/retriever.py
 from typing import List, Tuple, Dict
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from .loader import build_chunks
+from .loader import build_chunks, corpus_version
 
 import streamlit as st
 
+import contextlib
+import functools
+import os
+import importlib.util
+from collections import Counter, OrderedDict
 import numpy as np
+import scipy.sparse
 import logging
-from .loader import build_chunks
 
 logger = logging.getLogger(__name__)
 
-# Try importing SentenceTransformer for semantic search
-try:
+# SentenceTransformer (and torch behind it) is only imported when the model is
+# first needed, so importing this module stays cheap
+EMBEDDING_MODEL = "all-MiniLM-L6-v2" # Fast & good quality
+# "onnx" runs the same model through onnxruntime (rag/onnx_embedder.py); needs optimum[onnxruntime]
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")
+USE_ONNX = EMBEDDING_BACKEND == "onnx" and importlib.util.find_spec("optimum") is not None
+HAS_SEMANTIC = USE_ONNX or importlib.util.find_spec("sentence_transformers") is not None
+# Storage for document embeddings: "float32", "float16" (half the memory,
+# ranking unchanged in practice) or "int8" (per-vector symmetric scale; a quarter
+# of the memory, scores within ~1e-2 of float32). Either alternative, not both.
+EMBEDDING_PRECISION = os.getenv("RAG_EMBEDDING_PRECISION", "float32")
+SCORE_BLOCK_ROWS = 4096  # rows widened to int32/float32 at a time when scoring int8/float16
+# With faiss installed, float32 embeddings are searched through an inner-product
+# index and only the best FAISS_CANDIDATES_PER_K * top_k rows get a semantic score
+HAS_FAISS = importlib.util.find_spec("faiss") is not None
+FAISS_CANDIDATES_PER_K = 4
+ENCODE_BATCH_SIZE = 64  # chunks per forward pass when embedding the corpus
+# >0: rerank only the top RAG_KEYWORD_PREFILTER TF-IDF candidates semantically
+# (e.g. 200) instead of scoring every chunk. Off by default: chunks that match
+# the query only by meaning, with no shared terms, are never candidates.
+KEYWORD_PREFILTER = int(os.getenv("RAG_KEYWORD_PREFILTER", "0"))
+# CPU-only hosts shard corpora larger than this across worker processes
+MULTI_PROCESS_MIN_TEXTS = 1000
+MULTI_PROCESS_MAX_WORKERS = 8
+# Hybrid score = SEMANTIC_WEIGHT * cosine + KEYWORD_WEIGHT * TF-IDF cosine. The
+# weights are folded into the stored embeddings and the encoded query TF-IDF row,
+# so query() just adds the two products.
+SEMANTIC_WEIGHT = 0.7  # Weight semantic higher
+KEYWORD_WEIGHT = 0.3  # Weight keywords lower but still useful for specific terms
+# With numba installed, the dense float32 path fuses the matvec, the TF-IDF add
+# and top-k selection into one compiled pass (no dense score vector to sort)
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+
+@st.cache_resource(show_spinner=False)
+def _get_embedder():
+    # One model per process: an index rebuild (upload / Reset Index) reuses it
+    # instead of loading the weights again.
+    if USE_ONNX:
+        from .onnx_embedder import OnnxEmbedder
+        return OnnxEmbedder(EMBEDDING_MODEL)
+    import torch
     from sentence_transformers import SentenceTransformer
-    EMBEDDING_MODEL = "all-MiniLM-L6-v2" # Fast & good quality
-    HAS_SEMANTIC = True
-except ImportError:
-    SentenceTransformer = None
-    HAS_SEMANTIC = False
+    if torch.cuda.is_available():
+        return SentenceTransformer(EMBEDDING_MODEL, device="cuda").eval()
+    torch.set_num_threads(os.cpu_count() or 1)
+    return SentenceTransformer(EMBEDDING_MODEL, device="cpu").eval()
+
+def _inference_mode():
+    """torch.inference_mode() around embedder calls (no autograd state); no-op for ONNX."""
+    if USE_ONNX:
+        return contextlib.nullcontext()
+    import torch
+    return torch.inference_mode()
+
+QUERY_CACHE_SIZE = 512  # encoded queries kept per cache (reruns repeat the same query)
+
+def _normalize_query(q: str) -> str:
+    # MiniLM is uncased and TfidfVectorizer lowercases, so this loses nothing
+    return " ".join(q.split()).lower()
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _embed_normalized(q_norm: str):
+    with _inference_mode():
+        return _get_embedder().encode([q_norm], convert_to_numpy=True, normalize_embeddings=True)[0]
+
+def embed_query(q: str):
+    """L2-normalized query embedding from the shared model, or None without semantic search."""
+    if not HAS_SEMANTIC:
+        return None
+    return _embed_normalized(_normalize_query(q))
+
+def _combine_and_topk(doc_emb, q_vec, extra, k):
+    """Best k rows of doc_emb @ q_vec + extra, highest first; compiled by _numba_topk."""
+    n, d = doc_emb.shape
+    # min-heap of the best k (score, row) seen so far; root is the weakest
+    heap_s = np.full(k, -np.inf, dtype=np.float32)
+    heap_i = np.full(k, -1, dtype=np.int64)
+    for r in range(n):
+        s = extra[r]
+        for c in range(d):
+            s += doc_emb[r, c] * q_vec[c]
+        if s > heap_s[0]:
+            heap_s[0] = s
+            heap_i[0] = r
+            pos = 0
+            while True:
+                child = 2 * pos + 1
+                if child >= k:
+                    break
+                if child + 1 < k and heap_s[child + 1] < heap_s[child]:
+                    child += 1
+                if heap_s[child] >= heap_s[pos]:
+                    break
+                heap_s[pos], heap_s[child] = heap_s[child], heap_s[pos]
+                heap_i[pos], heap_i[child] = heap_i[child], heap_i[pos]
+                pos = child
+    order = np.argsort(-heap_s)
+    return heap_i[order], heap_s[order]
+
+@functools.lru_cache(maxsize=None)
+def _numba_topk():
+    """_combine_and_topk compiled with numba, or None when numba is unavailable."""
+    if not HAS_NUMBA:
+        return None
+    try:
+        import numba
+        return numba.njit(cache=True, fastmath=True)(_combine_and_topk)
+    except Exception as e:
+        logger.warning(f"numba unavailable: {e}")
+        return None
+
+def _quantize_int8(x: np.ndarray):
+    """Symmetric per-row int8 quantization: returns (int8 rows, float32 row scales)."""
+    scales = np.abs(x).max(axis=1).astype(np.float32) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(x / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales
 
 class HybridIndex:
     def __init__(self):
@@ -29,6 +142,11 @@ class HybridIndex:
         
         self.embedder = None
         self.doc_embeddings = None
+        self.doc_scales = None  # per-row dequantization scales when doc_embeddings is int8
+        # doc_embeddings rows are unit vectors times this (not normalized!)
+        self.semantic_weight = SEMANTIC_WEIGHT
+        # loader.corpus_version() when this index was loaded/built; answer caches compare against it
+        self.corpus_version = None
 
     def fit(self, chunks: List[Dict]):
         self.chunks = chunks
@@ -40,7 +158,8 @@ class HybridIndex:
                 stop_words="english",
                 max_df=0.95,
                 ngram_range=(1, 2),
-                sublinear_tf=True
+                sublinear_tf=True,
+                norm="l2"  # query() relies on unit rows: dot product == cosine
             )
             self.tfidf_matrix = self.vectorizer.fit_transform(texts)
         except Exception as e:
@@ -49,64 +168,289 @@ class HybridIndex:
         # 2. Semantic (Vector)
         if HAS_SEMANTIC:
             try:
-                # Lazy load model
+                # Lazy load model (shared, process-wide)
                 if not self.embedder:
-                    self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+                    self.embedder = _get_embedder()
                 
                 # Embed all chunks (may take a moment for large docs, but okay for typical RAG demos)
                 # Normalize embeddings for cosine similarity
-                self.doc_embeddings = self.embedder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+                # Encode in length order so each batch pads to similar lengths,
+                # then scatter back to chunk order
+                order = np.argsort([len(t) for t in texts], kind="stable")
+                emb_sorted = self._encode_corpus([texts[i] for i in order])
+                emb = np.empty_like(emb_sorted)
+                emb[order] = emb_sorted
+                emb *= self.semantic_weight
+                if EMBEDDING_PRECISION == "int8":
+                    self.doc_embeddings, self.doc_scales = _quantize_int8(emb)
+                elif EMBEDDING_PRECISION == "float16":
+                    self.doc_embeddings = emb.astype(np.float16)
+                else:
+                    self.doc_embeddings = emb.astype(np.float32, copy=False)
             except Exception as e:
                 logger.error(f"Semantic embedding failed: {e}")
                 self.doc_embeddings = None
 
-    def query(self, q: str, top_k: int = 8) -> List[Tuple[float, Dict]]:
+    def _encode_corpus(self, texts: List[str]) -> np.ndarray:
+        """L2-normalized embeddings; sharded over CPU worker processes for large corpora."""
+        workers = min(MULTI_PROCESS_MAX_WORKERS, os.cpu_count() or 1)
+        if not USE_ONNX and workers > 1 and len(texts) > MULTI_PROCESS_MIN_TEXTS:
+            import torch
+            if not torch.cuda.is_available():
+                pool = self.embedder.start_multi_process_pool(target_devices=["cpu"] * workers)
+                try:
+                    emb = self.embedder.encode_multi_process(texts, pool, batch_size=32)
+                finally:
+                    self.embedder.stop_multi_process_pool(pool)
+                norms = np.linalg.norm(emb, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                return (emb / norms).astype(np.float32, copy=False)
+        with _inference_mode():
+            return self.embedder.encode(
+                texts, batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True, normalize_embeddings=True,
+            )
+
+    def _tfidf_query_row(self, q_norm: str):
+        """
+        Same row as vectorizer.transform([q_norm]) * KEYWORD_WEIGHT, built from the
+        fitted analyzer, vocabulary and idf_ without the transform() pipeline:
+        sublinear tf, idf weighting and L2 normalization on the raw arrays.
+        """
+        analyzer = self.__dict__.get("_analyzer")
+        if analyzer is None:
+            analyzer = self._analyzer = self.vectorizer.build_analyzer()
+        vocab = self.vectorizer.vocabulary_
+        counts = Counter(vocab[t] for t in analyzer(q_norm) if t in vocab)
+        cols = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        data = (1.0 + np.log(tf)) * self.vectorizer.idf_[cols]  # sublinear_tf=True
+        norm = np.sqrt(np.dot(data, data))
+        if norm > 0:
+            data *= KEYWORD_WEIGHT / norm
+        return scipy.sparse.csr_matrix(
+            (data, cols, np.array([0, len(cols)], dtype=np.int32)),
+            shape=(1, len(self.vectorizer.idf_)),
+        )
+
+    def _faiss_index(self):
+        """Inner-product faiss index over the float32 embeddings, built lazily; None if unavailable."""
+        if "_faiss" not in self.__dict__:
+            self._faiss = None
+            if HAS_FAISS and self._dense_float32():
+                try:
+                    import faiss
+                    index = faiss.IndexFlatIP(self.doc_embeddings.shape[1])
+                    index.add(np.ascontiguousarray(self.doc_embeddings, dtype=np.float32))
+                    self._faiss = index
+                except Exception as e:
+                    logger.warning(f"faiss index build failed, using np.dot: {e}")
+        return self._faiss
+
+    def _encode_query(self, q_norm: str):
+        """(query embedding or None, query TF-IDF row or None if it has no terms), LRU-cached per index."""
+        cache = self.__dict__.setdefault("_encoded", OrderedDict())
+        hit = cache.get(q_norm)
+        if hit is not None:
+            cache.move_to_end(q_norm)
+            return hit
+        q_vec = None
+        if self.doc_embeddings is not None and self.embedder is not None:
+            # same process-wide model and lru cache as embed_query (answer caches
+            # have usually embedded this query already)
+            q_vec = _embed_normalized(q_norm)
+        q_tfidf = None
+        if self.vectorizer is not None and self.tfidf_matrix is not None:
+            q_tfidf = self._tfidf_query_row(q_norm)
+            if q_tfidf.nnz == 0:
+                q_tfidf = None  # only stop words / out-of-vocabulary terms: no keyword scores
+        cache[q_norm] = (q_vec, q_tfidf)
+        if len(cache) > QUERY_CACHE_SIZE:
+            cache.popitem(last=False)
+        return q_vec, q_tfidf
+
+    def _dense_float32(self) -> bool:
+        """True when doc_embeddings is a plain float32 matrix (faiss / numba paths)."""
+        return self.doc_embeddings is not None and self.doc_embeddings.dtype == np.float32
+
+    def _semantic_scores(self, q_vec: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        scales = getattr(self, "doc_scales", None)
+        if rows is not None:
+            # a short candidate list: gather and widen just those rows
+            block = self.doc_embeddings[rows]
+            if scales is None:
+                return block.astype(np.float32) @ np.asarray(q_vec, dtype=np.float32)
+            q_int8, q_scale = _quantize_int8(q_vec[None, :])
+            return (block.astype(np.int32) @ q_int8[0].astype(np.int32)) * scales[rows] * q_scale[0]
+        if self.doc_embeddings.dtype == np.float16:
+            # upcast a block at a time: the full matrix is read as float16 and
+            # never copied to float32 whole
+            q32 = np.asarray(q_vec, dtype=np.float32)
+            out = np.empty(len(self.doc_embeddings), dtype=np.float32)
+            for start in range(0, len(out), SCORE_BLOCK_ROWS):
+                block = self.doc_embeddings[start:start + SCORE_BLOCK_ROWS]
+                out[start:start + len(block)] = block.astype(np.float32) @ q32
+            return out
+        if scales is None:
+            return np.dot(self.doc_embeddings, q_vec)
+        # int8 x int8 accumulated in int32, a block of rows at a time so the
+        # widened copy stays small, then rescaled by both per-vector scales
+        q_int8, q_scale = _quantize_int8(q_vec[None, :])
+        q32 = q_int8[0].astype(np.int32)
+        out = np.empty(len(self.doc_embeddings), dtype=np.float32)
+        for start in range(0, len(out), SCORE_BLOCK_ROWS):
+            block = self.doc_embeddings[start:start + SCORE_BLOCK_ROWS]
+            out[start:start + len(block)] = block.astype(np.int32) @ q32
+        return out * scales * q_scale[0]
+
+    def query(self, q: str, top_k: int = 8) -> List[Tuple[float, Dict, float]]:
+        """
+        (score, chunk, max_score) for the best top_k chunks. max_score is the total
+        weight of the branches that scored that chunk (1.0 when both did), so a
+        relevance cutoff can be applied as score >= cutoff * max_score whatever
+        backend is active (TF-IDF only, or rows outside the faiss candidates).
+        """
         if not self.chunks:
             return []
         
+        k = min(top_k, len(self.chunks))
+        if k <= 0 or not q.strip():
+            return []
+        q_vec, q_tfidf = self._encode_query(_normalize_query(q))
+        sem_w = self.semantic_weight if q_vec is not None else 0.0
+        kw_w = KEYWORD_WEIGHT if q_tfidf is not None else 0.0
+
+        # Keyword prefilter: TF-IDF picks the candidates, semantic scores only rerank them
+        if KEYWORD_PREFILTER and q_vec is not None and q_tfidf is not None and len(self.chunks) > KEYWORD_PREFILTER:
+            kw_scores = self.tfidf_matrix.dot(q_tfidf.T).toarray().ravel()
+            cand = np.argpartition(kw_scores, -KEYWORD_PREFILTER)[-KEYWORD_PREFILTER:]
+            cand = cand[kw_scores[cand] > 0.0]
+            if len(cand) == 0:
+                return []
+            return self._top_k(kw_scores[cand] + self._semantic_scores(q_vec, cand), k, sem_w + kw_w, cand)
+
+        # Dense float32 embeddings without faiss: one fused compiled pass
+        topk = _numba_topk() if q_vec is not None and self._dense_float32() else None
+        if topk is not None and self._faiss_index() is None:
+            if q_tfidf is not None:
+                extra = self.tfidf_matrix.dot(q_tfidf.T).toarray().ravel().astype(np.float32)
+            else:
+                extra = np.zeros(len(self.chunks), dtype=np.float32)
+            idx, top_scores = topk(np.asarray(self.doc_embeddings), np.asarray(q_vec, dtype=np.float32), extra, k)
+            return [(float(sc), self.chunks[i], sem_w + kw_w) for i, sc in zip(idx, top_scores) if i >= 0 and sc > 0.0]
+
         # Calculate scores
         scores = np.zeros(len(self.chunks))
+        max_scores = sem_w + kw_w
         
         # A. Semantic Score
-        if self.doc_embeddings is not None and self.embedder is not None:
-            q_vec = self.embedder.encode([q], convert_to_numpy=True, normalize_embeddings=True)
-            # Dot product since vectors are normalized = cosine similarity
-            sem_scores = np.dot(self.doc_embeddings, q_vec[0])
-            scores += (sem_scores * 0.7) # Weight semantic higher
+        if q_vec is not None:
+            # Rows are weighted unit vectors, so the dot product is the weighted cosine
+            index = self._faiss_index()
+            if index is not None:
+                n = min(top_k * FAISS_CANDIDATES_PER_K, index.ntotal)
+                D, I = index.search(np.asarray(q_vec, dtype=np.float32)[None, :], n)
+                keep = I[0] >= 0
+                scores[I[0][keep]] += D[0][keep]
+                # rows outside the candidates only carry the keyword part
+                max_scores = np.full(len(self.chunks), kw_w)
+                max_scores[I[0][keep]] += sem_w
+            else:
+                scores += self._semantic_scores(q_vec)
             
         # B. Keyword Score (TF-IDF)
-        if self.vectorizer is not None and self.tfidf_matrix is not None:
-            q_tfidf = self.vectorizer.transform([q])
-            # Cosine similarity for sparse matrix
-            tfidf_scores = cosine_similarity(q_tfidf, self.tfidf_matrix)[0]
-            scores += (tfidf_scores * 0.3) # Weight keywords lower but still useful for specific terms
-
-        # Get top K
-        # argsort gives ascending, so we take last top_k and reverse
-        if len(scores) == 0:
+        if q_tfidf is not None:
+            # Rows are L2-normalized by the vectorizer (norm="l2") and the query row
+            # carries KEYWORD_WEIGHT, so a sparse mat-vec is the weighted cosine
+            scores += self.tfidf_matrix.dot(q_tfidf.T).toarray().ravel()
+
+        return self._top_k(scores, k, max_scores)
+
+    def _top_k(self, scores: np.ndarray, k: int, max_scores, rows: np.ndarray = None) -> List[Tuple[float, Dict, float]]:
+        """
+        Best k positive scores, highest first; max_scores is a scalar or a per-position
+        array (see query), rows maps positions to chunk indices.
+        """
+        # argpartition selects the top k in O(N); only those k get sorted
+        if len(scores) == 0 or scores.max() <= 0.0:
             return []
-            
-        top_indices = np.argsort(scores)[-top_k:][::-1]
+
+        k = min(k, scores.size)
+        part = np.argpartition(scores, -k)[-k:]
+        top = part[np.argsort(-scores[part])]
         
         results = []
-        for i in top_indices:
-            if scores[i] > 0.0: # Filter out zero matches
-                results.append((float(scores[i]), self.chunks[i]))
+        for j in top:
+            if scores[j] > 0.0: # Filter out zero matches
+                i = j if rows is None else rows[j]
+                m = max_scores if np.isscalar(max_scores) else max_scores[j]
+                results.append((float(scores[j]), self.chunks[i], float(m)))
         
         return results
 
-import pickle
-import os
+import json
+import shutil
+
+import joblib
+
+INDEX_DIR = "data/index"
+LEGACY_INDEX_FILE = "data/index.pkl"  # pickled HybridIndex from older builds
 
-INDEX_FILE = "data/index.pkl"
+def save_index(idx: HybridIndex, path: str = INDEX_DIR):
+    """
+    Writes the index as separate files so loading can memory-map the embeddings
+    instead of unpickling everything: emb.npy (+ emb_scales.npy for int8),
+    tfidf.npz, vectorizer.joblib and chunks.json. Written to a temp dir, then swapped in.
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(idx.chunks, f, ensure_ascii=False)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"semantic_weight": idx.semantic_weight}, f)
+    if idx.vectorizer is not None and idx.tfidf_matrix is not None:
+        joblib.dump(idx.vectorizer, os.path.join(tmp, "vectorizer.joblib"))
+        scipy.sparse.save_npz(os.path.join(tmp, "tfidf.npz"), idx.tfidf_matrix.tocsr())
+    if idx.doc_embeddings is not None:
+        np.save(os.path.join(tmp, "emb.npy"), idx.doc_embeddings)
+        if idx.doc_scales is not None:
+            np.save(os.path.join(tmp, "emb_scales.npy"), idx.doc_scales)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+def load_index(path: str = INDEX_DIR) -> HybridIndex:
+    idx = HybridIndex()
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("semantic_weight") != SEMANTIC_WEIGHT:
+        raise ValueError("index was built with different score weights")
+    with open(os.path.join(path, "chunks.json"), "r", encoding="utf-8") as f:
+        idx.chunks = json.load(f)
+    vec_path = os.path.join(path, "vectorizer.joblib")
+    if os.path.exists(vec_path):
+        idx.vectorizer = joblib.load(vec_path)
+        idx.tfidf_matrix = scipy.sparse.load_npz(os.path.join(path, "tfidf.npz"))
+    emb_path = os.path.join(path, "emb.npy")
+    if os.path.exists(emb_path) and HAS_SEMANTIC:
+        # Pages of the matrix are read on first access rather than up front
+        idx.doc_embeddings = np.load(emb_path, mmap_mode="r")
+        scales_path = os.path.join(path, "emb_scales.npy")
+        if os.path.exists(scales_path):
+            idx.doc_scales = np.load(scales_path)
+        idx.embedder = _get_embedder()
+    return idx
 
 @st.cache_resource(show_spinner="Loading index...")
 def get_or_create_index() -> HybridIndex:
+    # Stamped once per load/reload rather than re-walking data/docs per query
+    version = corpus_version()
+
     # 1. Try loading from disk
-    if os.path.exists(INDEX_FILE):
+    if os.path.exists(os.path.join(INDEX_DIR, "chunks.json")):
         try:
-            with open(INDEX_FILE, "rb") as f:
-                idx = pickle.load(f)
+            idx = load_index()
+            idx.corpus_version = version
             logger.info(f"Loaded index from disk: {len(idx.chunks)} chunks")
             return idx
         except Exception as e:
@@ -114,19 +458,22 @@ def get_or_create_index() -> HybridIndex:
 
     # 2. Build from scratch
     idx = HybridIndex()
+    idx.corpus_version = version
     try:
         chunks = build_chunks()
         if chunks:
             idx.fit(chunks)
             # Save to disk
-            with open(INDEX_FILE, "wb") as f:
-                pickle.dump(idx, f)
+            save_index(idx)
             logger.info("Saved new index to disk.")
     except Exception as e:
         logger.error(f"Index build failed: {e}")
     return idx
 
 def clear_index_cache():
-    if os.path.exists(INDEX_FILE):
-        os.remove(INDEX_FILE)
-    st.cache_resource.clear()
+    shutil.rmtree(INDEX_DIR, ignore_errors=True)
+    if os.path.exists(LEGACY_INDEX_FILE):
+        os.remove(LEGACY_INDEX_FILE)
+    # Only drop the cached index; other st.cache_resource entries (DB connection,
+    # lazily imported modules) stay warm across an upload.
+    get_or_create_index.clear()
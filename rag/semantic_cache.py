@@ -0,0 +1,55 @@
+# rag/semantic_cache.py
+# Random-hyperplane LSH over unit-length query embeddings, used by QueryCache's
+# semantic tier so a lookup compares against one bucket neighbourhood instead of
+# every cached query. Vectors whose cosine is ~0.95 agree on almost every sign
+# bit, so probing the exact bucket plus all Hamming-distance-1 buckets finds
+# near-duplicates with n_bits + 1 dict lookups.
+
+from typing import Dict, Hashable, Set
+
+import numpy as np
+
+
+class SemanticLSH:
+    def __init__(self, n_bits: int = 16, seed: int = 0):
+        self.n_bits = n_bits
+        self.seed = seed
+        self._planes = None  # (n_bits, dim), created on the first vector
+        self._weights = 1 << np.arange(n_bits, dtype=np.int64)
+        self._buckets: Dict[int, Set[Hashable]] = {}
+        self._sig_of: Dict[Hashable, int] = {}
+
+    def signature(self, embedding: np.ndarray) -> int:
+        v = np.asarray(embedding, dtype=np.float32).ravel()
+        if self._planes is None:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((self.n_bits, v.shape[0])).astype(np.float32)
+        return int((self._planes @ v > 0).astype(np.int64) @ self._weights)
+
+    def add(self, key: Hashable, embedding: np.ndarray) -> None:
+        self.remove(key)
+        sig = self.signature(embedding)
+        self._buckets.setdefault(sig, set()).add(key)
+        self._sig_of[key] = sig
+
+    def remove(self, key: Hashable) -> None:
+        sig = self._sig_of.pop(key, None)
+        if sig is None:
+            return
+        bucket = self._buckets.get(sig)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[sig]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._sig_of.clear()
+
+    def candidates(self, embedding: np.ndarray) -> Set[Hashable]:
+        """Keys in the query's bucket and in every bucket one bit flip away."""
+        sig = self.signature(embedding)
+        out: Set[Hashable] = set(self._buckets.get(sig, ()))
+        for i in range(self.n_bits):
+            out.update(self._buckets.get(sig ^ (1 << i), ()))
+        return out
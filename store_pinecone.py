@@ -1,31 +1,44 @@
 import os
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from pinecone import Pinecone, ServerlessSpec, PodSpec
 from pathlib import Path # ADDED: For robust path handling
 import json 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 DIMENSION = 384 
 BATCH_SIZE = 100 
+UPSERT_WORKERS = 16  # upsert requests in flight; latency-bound, so threads overlap well
+MAX_PENDING_UPSERTS = 2 * UPSERT_WORKERS  # submitted batches held in memory at once
 BASE_DIR = Path(__file__).parent
+INPUT_PARQUET_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.parquet"
+INPUT_NPY_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.npy"
+# Older embedder runs wrote a single CSV with JSON-encoded embeddings
 INPUT_CSV_PATH = BASE_DIR / "chunks" / "chunks_with_embeddings.csv"
+def _vector_batch(df, embeddings):
+    """(id, values, metadata) tuples for one DataFrame slice, built column-wise."""
+    meta = df[["text", "source"]].assign(page=df["page"].astype(int)).to_dict("records")
+    return list(zip(df["id"].tolist(), embeddings, meta))
+def iter_vector_batches():
+    """Yields upsert batches of BATCH_SIZE vectors from the Parquet + .npy store, or the legacy CSV."""
+    if INPUT_PARQUET_PATH.exists() and INPUT_NPY_PATH.exists():
+        chunks_df = pd.read_parquet(INPUT_PARQUET_PATH, columns=["id", "text", "source", "page"])
+        embeddings = np.load(INPUT_NPY_PATH, mmap_mode="r")
+        for i in range(0, len(chunks_df), BATCH_SIZE):
+            yield _vector_batch(chunks_df.iloc[i:i + BATCH_SIZE], np.asarray(embeddings[i:i + BATCH_SIZE], dtype=np.float64).tolist())
+        return
+    for df_chunk in pd.read_csv(INPUT_CSV_PATH, chunksize=BATCH_SIZE, converters={'embedding': json.loads}):
+        yield _vector_batch(df_chunk, [[float(x) for x in e] for e in df_chunk["embedding"]])
 def upload_to_pinecone():
     """Connects to Pinecone, manages the index, and uploads the vectors/embeddings."""
-    try:
-        chunks_df = pd.read_csv(INPUT_CSV_PATH, converters={'embedding': json.loads})
-    except FileNotFoundError:
-        print(f"ERROR: File not found at the expected path: {INPUT_CSV_PATH.resolve()}")
+    if not (INPUT_PARQUET_PATH.exists() and INPUT_NPY_PATH.exists()) and not INPUT_CSV_PATH.exists():
+        print(f"ERROR: File not found at the expected path: {INPUT_PARQUET_PATH.resolve()}")
         print("Please run 'python embedder.py' first to create the file.")
         return
-    except pd.errors.EmptyDataError:
-        print(f"ERROR: The file at {INPUT_CSV_PATH.resolve()} is empty. No documents were processed.")
-        return
-    if chunks_df.empty:
-        print(f"ERROR: No valid data found in '{INPUT_CSV_PATH.name}'. Ensure your documents were processed correctly.")
-        return
     print("Initializing Pinecone connection...")
     try:
         pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
@@ -43,22 +56,36 @@ def upload_to_pinecone():
         )
         print("Index created successfully.")
     index = pc.Index(PINECONE_INDEX_NAME)
-    vectors_to_upsert = []
-    for _, chunk in chunks_df.iterrows():
-        vector_id = chunk["id"]
-        vector_values = chunk["embedding"] 
-        metadata = {
-            "text": chunk["text"],
-            "source": chunk["source"],
-            "page": int(chunk["page"])  # FIXED: Convert to integer explicitly
-        }
-        vectors_to_upsert.append((vector_id, vector_values, metadata))
-    print(f"Uploading {len(vectors_to_upsert)} vectors to Pinecone...")
-    for i in range(0, len(vectors_to_upsert), BATCH_SIZE):
-        batch = vectors_to_upsert[i:i + BATCH_SIZE]
-        index.upsert(vectors=batch)
-        if (i // BATCH_SIZE + 1) % 5 == 0:
-            print(f"--- Uploaded batch {i // BATCH_SIZE + 1} ---")
+    print("Uploading vectors to Pinecone...")
+    # Batches are read and submitted as they stream in; the pool keeps up to
+    # UPSERT_WORKERS requests in flight, and reading pauses once
+    # MAX_PENDING_UPSERTS batches are outstanding so memory stays bounded
+    total = 0
+    done = 0
+    def reap(finished):
+        nonlocal done
+        for future in finished:
+            future.result()  # re-raises a failed upsert
+            done += 1
+            if done % 5 == 0:
+                print(f"--- Uploaded batch {done} ---")
+    try:
+        with ThreadPoolExecutor(max_workers=UPSERT_WORKERS) as pool:
+            pending = set()
+            for batch in iter_vector_batches():
+                if len(pending) >= MAX_PENDING_UPSERTS:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    reap(finished)
+                total += len(batch)
+                pending.add(pool.submit(index.upsert, vectors=batch))
+            reap(wait(pending).done)
+    except pd.errors.EmptyDataError:
+        print(f"ERROR: The file at {INPUT_CSV_PATH.resolve()} is empty. No documents were processed.")
+        return
+    if total == 0:
+        print(f"ERROR: No valid data found in '{INPUT_PARQUET_PATH.name}'. Ensure your documents were processed correctly.")
+        return
+    print(f"Uploaded {total} vectors.")
     stats = index.describe_index_stats()
     print(f"\nUpload complete. Total vectors in index: {stats.total_vector_count}")
 if __name__ == "__main__":